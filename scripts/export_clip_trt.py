@@ -0,0 +1,76 @@
+"""
+One-time export of the CLIP image tower to a TensorRT engine.
+
+    python scripts/export_clip_trt.py
+
+Exports `clip_model.visual` (ViT-L-14 / laion2b_s32b_b82k) to ONNX with a
+dynamic batch dimension, then builds an FP16 engine with trtexec at
+Config.CLIP_TRT_ENGINE. AIEngine picks the engine up on the next start and
+uses it for batch image encodes; delete the file to go back to torch.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+import open_clip
+
+from src.config import Config
+
+MIN_BATCH, OPT_BATCH, MAX_BATCH = 1, 16, 64
+
+
+def export_onnx(onnx_path: str):
+    print("Loading CLIP model (ViT-L-14 / laion2b_s32b_b82k)...")
+    model, _, _ = open_clip.create_model_and_transforms('ViT-L-14', pretrained='laion2b_s32b_b82k', device='cpu')
+    model.eval()
+
+    dummy = torch.zeros((1, 3, 224, 224), dtype=torch.float32)
+    print(f"Exporting visual tower to {onnx_path}...")
+    with torch.inference_mode():
+        torch.onnx.export(
+            model.visual, dummy, onnx_path,
+            input_names=["x"], output_names=["emb"],
+            dynamic_axes={"x": {0: "b"}, "emb": {0: "b"}},
+            opset_version=17,
+        )
+
+
+def build_engine(onnx_path: str, engine_path: str):
+    trtexec = shutil.which("trtexec")
+    if trtexec is None:
+        sys.exit("trtexec not found on PATH (it ships with the TensorRT package).")
+
+    shape = "x:{}x3x224x224"
+    cmd = [
+        trtexec, f"--onnx={onnx_path}", "--fp16",
+        f"--minShapes={shape.format(MIN_BATCH)}",
+        f"--optShapes={shape.format(OPT_BATCH)}",
+        f"--maxShapes={shape.format(MAX_BATCH)}",
+        f"--saveEngine={engine_path}",
+    ]
+    print("Building TensorRT engine (this takes a few minutes)...")
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", default=Config.CLIP_TRT_ENGINE, help="output engine path")
+    parser.add_argument("--onnx", default=None, help="intermediate ONNX path (default: next to the engine)")
+    args = parser.parse_args()
+
+    onnx_path = args.onnx or os.path.splitext(args.engine)[0] + ".onnx"
+    os.makedirs(os.path.dirname(os.path.abspath(args.engine)), exist_ok=True)
+
+    if not os.path.exists(onnx_path):
+        export_onnx(onnx_path)
+    build_engine(onnx_path, args.engine)
+    print(f"Done: {args.engine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from src.core.thumbnails import load_video_frame
+
+# Requests arriving within BATCH_WINDOW of each other share one VLM forward pass
+MAX_BATCH_SIZE = 4
+BATCH_WINDOW = 0.02  # seconds
+# Release VRAM once no chat job has arrived for this long
+IDLE_UNLOAD_SECONDS = 60.0
+# Finished jobs are kept this long for the client to poll
+JOB_TTL_SECONDS = 600.0
+
+_queue: Optional[asyncio.Queue] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# _jobs is touched from request threadpool threads and from the worker's loop
+_jobs: Dict[str, dict] = {}
+_jobs_lock = threading.Lock()
+
+
+def submit(file_path: str, prompt: str) -> str:
+    """
+    Queue a chat job and return its id. Requires the worker to be running.
+    Safe to call from any thread: the put is handed to the worker's event loop,
+    since asyncio.Queue only wakes its getters when used from that loop.
+    """
+    queue, loop = _queue, _loop
+    if queue is None or loop is None:
+        raise RuntimeError("Chat worker is not running")
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _expire_jobs()
+        _jobs[job_id] = {'status': 'pending', 'created': time.monotonic()}
+    try:
+        loop.call_soon_threadsafe(queue.put_nowait, (job_id, file_path, prompt))
+    except RuntimeError:  # loop closed while we were submitting
+        with _jobs_lock:
+            _jobs.pop(job_id, None)
+        raise RuntimeError("Chat worker is not running")
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != 'created'}
+
+
+def _expire_jobs():
+    # Caller holds _jobs_lock
+    cutoff = time.monotonic() - JOB_TTL_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job['status'] != 'pending' and job['created'] < cutoff]:
+        del _jobs[job_id]
+
+
+def _load_image(path: str) -> Image.Image:
+    try:
+        # Try opening as image first
+        return Image.open(path).convert("RGB")
+    except Exception:
+        # If it fails, assume it's a video and grab a frame
+        img = load_video_frame(path)
+        if img is None:
+            raise ValueError("Failed to extract frame from video (ffmpeg or decord required)")
+        return img
+
+
+def _run_batch(vlm, batch: List[tuple]) -> List[tuple]:
+    """Load media and answer a batch; returns (job_id, status, text) per job."""
+    outcomes, images, prompts, job_ids = [], [], [], []
+    for job_id, path, prompt in batch:
+        try:
+            images.append(_load_image(path))
+            prompts.append(prompt)
+            job_ids.append(job_id)
+        except Exception as e:
+            outcomes.append((job_id, 'error', str(e)))
+
+    if images:
+        try:
+            answers = vlm.ask_image_batch(images, prompts)
+            outcomes.extend((job_id, 'done', answer) for job_id, answer in zip(job_ids, answers))
+        except Exception as e:
+            outcomes.extend((job_id, 'error', str(e)) for job_id in job_ids)
+    return outcomes
+
+
+async def run_worker(get_vlm):
+    """Drain the chat queue in small batches; unload the VLM when idle."""
+    global _queue, _loop
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    vlm = None
+    try:
+        while True:
+            try:
+                first = await asyncio.wait_for(_queue.get(), timeout=IDLE_UNLOAD_SECONDS)
+            except asyncio.TimeoutError:
+                if vlm is not None:
+                    await asyncio.to_thread(vlm.unload)
+                continue
+
+            # Coalesce whatever else arrives within the batching window
+            batch = [first]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                if vlm is None:
+                    vlm = await asyncio.to_thread(get_vlm)
+                outcomes = await asyncio.to_thread(_run_batch, vlm, batch)
+            except Exception as e:
+                outcomes = [(job_id, 'error', str(e)) for job_id, _, _ in batch]
+
+            with _jobs_lock:
+                for job_id, status, text in outcomes:
+                    job = _jobs.get(job_id)
+                    if job is not None:
+                        job['status'] = status
+                        job['answer' if status == 'done' else 'error'] = text
+    finally:
+        _queue = None
+        _loop = None
@@ -1,24 +1,31 @@
 import sys
 import os
 from functools import lru_cache
+from typing import TYPE_CHECKING
 
 # Add project root to path so we can import src
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.core.ai_models import AIEngine
-from src.core.vlm_engine import VLMEngine
 from src.data.db_manager import DBManager
 from src.config import Config
 
+# The AI engines pull in torch/open_clip/transformers; import them on first use
+# so the API starts (and reloads) without paying for it.
+if TYPE_CHECKING:
+    from src.core.ai_models import AIEngine
+    from src.core.vlm_engine import VLMEngine
+
 @lru_cache()
-def get_ai_engine() -> AIEngine:
+def get_ai_engine() -> 'AIEngine':
     """Singleton for AI Engine."""
+    from src.core.ai_models import AIEngine
     print("Initializing AIEngine Singleton...")
     return AIEngine()
 
 @lru_cache()
-def get_vlm_engine() -> VLMEngine:
+def get_vlm_engine() -> 'VLMEngine':
     """Singleton for VLM Engine."""
+    from src.core.vlm_engine import VLMEngine
     print("Initializing VLMEngine Singleton...")
     return VLMEngine()
 
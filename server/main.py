@@ -5,11 +5,31 @@ import os
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from server import chat_queue
+from server.dependencies import get_vlm_engine
+from server.middleware import db_version_cache
 from server.routers import gallery, media, scan
 
-app = FastAPI(title="LocalCurator Prime API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background VLM worker for /gallery/chat (submit + poll)
+    worker = asyncio.create_task(chat_queue.run_worker(get_vlm_engine))
+    yield
+    worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await worker
+
+# orjson encodes responses straight to bytes, several times faster than stdlib json
+app = FastAPI(title="LocalCurator Prime API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# ETag / X-DB-Version on gallery GETs (registered before CORS so CORS stays outermost)
+app.middleware("http")(db_version_cache)
 
 # CORS
 app.add_middleware(
@@ -18,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Version"],
 )
 
 # Routers
@@ -30,5 +51,10 @@ async def health_check():
     return {"status": "ok"}
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # uvloop + httptools cut per-request overhead on the polled status endpoints;
+    # uvloop has no Windows build, so fall back to the stdlib loop there
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, loop=loop, http=http)
@@ -0,0 +1,55 @@
+import threading
+
+from cachetools import TTLCache
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from .dependencies import get_db_manager
+
+# Read-only GET routes whose output depends only on the database contents
+VERSIONED_PREFIX = "/gallery"
+UNVERSIONED_PREFIXES = ("/gallery/chat",)
+
+# Encoded response bodies keyed by (path, query, files_version). A write to
+# files bumps files_version, so stale entries are never hit.
+_body_cache = TTLCache(maxsize=512, ttl=60)
+_body_cache_lock = threading.Lock()
+
+
+def _is_versioned(request: Request) -> bool:
+    path = request.url.path
+    return (request.method == "GET" and path.startswith(VERSIONED_PREFIX)
+            and not path.startswith(UNVERSIONED_PREFIXES))
+
+
+async def db_version_cache(request: Request, call_next):
+    """
+    Tag gallery GETs with X-DB-Version / ETag, answer 304 when the client's
+    copy is current, and replay memoized bodies for repeated queries.
+    """
+    if not _is_versioned(request):
+        return await call_next(request)
+
+    version = await run_in_threadpool(lambda: get_db_manager().files_version)
+    etag = f'W/"db-{version}"'
+    headers = {"ETag": etag, "X-DB-Version": str(version), "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    key = (request.url.path, request.url.query, version)
+    with _body_cache_lock:
+        hit = _body_cache.get(key)
+    if hit is not None:
+        body, media_type = hit
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type")
+    with _body_cache_lock:
+        _body_cache[key] = (body, media_type)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,13 +1,17 @@
 
-from fastapi import APIRouter, Depends, Query, HTTPException, BackgroundTasks
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import Response
+from typing import TYPE_CHECKING, Dict, List, Optional
 from pydantic import BaseModel
-import json
+import orjson
 import os
 
+from .. import chat_queue
 from ..dependencies import get_db_manager, get_ai_engine
 from src.data.db_manager import DBManager
-from src.core.ai_models import AIEngine
+
+if TYPE_CHECKING:
+    from src.core.ai_models import AIEngine
 
 router = APIRouter(prefix="/gallery", tags=["gallery"])
 
@@ -23,6 +27,31 @@ class MediaItemResponse(BaseModel):
     score: Optional[float] = None
     snippet: Optional[str] = None
 
+# Label columns stay as their stored JSON text (validated by SQLite) and are spliced
+# into the response with orjson.Fragment, so they are never parsed and re-encoded.
+MEDIA_COLUMNS = """id, file_path, media_type, width, height,
+        CASE WHEN json_valid(tags) THEN tags ELSE '[]' END AS tags,
+        CASE WHEN json_valid(character_tags) THEN character_tags ELSE '[]' END AS character_tags,
+        CASE WHEN json_valid(series_tags) THEN series_tags ELSE '[]' END AS series_tags"""
+
+def media_items_response(rows, scores: Optional[Dict[str, float]] = None,
+                         snippets: Optional[Dict[int, str]] = None) -> Response:
+    """Encode files rows as a MediaItemResponse list without building pydantic models."""
+    items = [{
+        'id': r['id'],
+        'file_path': r['file_path'],
+        'media_type': r['media_type'],
+        'width': r['width'],
+        'height': r['height'],
+        'tags': orjson.Fragment(r['tags']),
+        'character_tags': orjson.Fragment(r['character_tags']),
+        'series_tags': orjson.Fragment(r['series_tags']),
+        # Text matches get a 1.0 score by default
+        'score': scores.get(r['file_path'], 1.0) if scores is not None else None,
+        'snippet': snippets.get(r['id']) if snippets is not None else None,
+    } for r in rows]
+    return Response(orjson.dumps(items), media_type="application/json")
+
 @router.get("/", response_model=List[MediaItemResponse])
 def list_media(
     limit: int = 50,
@@ -40,24 +69,25 @@ def list_media(
     where_clauses = ["is_processed=1"]
     params = []
 
+    # Label filters probe the indexed normalized tables instead of LIKE-scanning JSON
     if character and character != "All":
-        where_clauses.append("character_tags LIKE ?")
-        params.append(f'%"{character}"%')
+        where_clauses.append("EXISTS (SELECT 1 FROM file_characters WHERE name = ? AND file_id = files.id)")
+        params.append(character)
     
     if series and series != "All":
-        where_clauses.append("series_tags LIKE ?")
-        params.append(f'%"{series}"%')
+        where_clauses.append("EXISTS (SELECT 1 FROM file_series WHERE name = ? AND file_id = files.id)")
+        params.append(series)
 
     if tag:
-        where_clauses.append("tags LIKE ?")
-        params.append(f'%"{tag}"%')
+        where_clauses.append("EXISTS (SELECT 1 FROM file_tags WHERE tag = ? AND file_id = files.id)")
+        params.append(tag)
         
     if media_type:
         where_clauses.append("media_type = ?")
         params.append(media_type.lower())
 
     query = f"""
-        SELECT id, file_path, media_type, width, height, tags, character_tags, series_tags
+        SELECT {MEDIA_COLUMNS}
         FROM files
         WHERE {' AND '.join(where_clauses)}
         ORDER BY created_at DESC
@@ -65,44 +95,14 @@ def list_media(
     """
     params.extend([limit, offset])
 
-    import sqlite3
-    conn = sqlite3.connect(db.sqlite_path)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    try:
-        c.execute(query, params)
-        rows = c.fetchall()
-        
-        results = []
-        for r in rows:
-            # Helper to safely parse JSON
-            def parse_json(x):
-                if not x: return []
-                try:
-                    return json.loads(x)
-                except:
-                    return []
-
-            results.append(MediaItemResponse(
-                id=r['id'],
-                file_path=r['file_path'],
-                media_type=r['media_type'],
-                width=r['width'],
-                height=r['height'],
-                tags=parse_json(r['tags']),
-                character_tags=parse_json(r['character_tags']),
-                series_tags=parse_json(r['series_tags'])
-            ))
-        return results
-    finally:
-        conn.close()
+    rows = db.get_conn().execute(query, params).fetchall()
+    return media_items_response(rows)
 
 @router.post("/search", response_model=List[MediaItemResponse])
 def search_media(
     query: str,
     top_k: int = 50,
-    ai: AIEngine = Depends(get_ai_engine),
+    ai: 'AIEngine' = Depends(get_ai_engine),
     db: DBManager = Depends(get_db_manager)
 ):
 
@@ -112,182 +112,70 @@ def search_media(
     if not query:
         return []
 
-    # 1. Fetch from SQLite via Text Search
-    import sqlite3
-    conn = sqlite3.connect(db.sqlite_path)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    # Text match search in audio_transcription and frame_descriptions
-    escaped_query = query.replace("%", "\\%").replace("_", "\\_")
-    text_search_query = f"%{escaped_query}%"
-    c.execute("""
-        SELECT id, file_path, media_type, width, height, tags, character_tags, series_tags, audio_transcription, frame_descriptions
-        FROM files
-        WHERE media_type = 'video' AND 
-              (audio_transcription LIKE ? OR frame_descriptions LIKE ?)
-        LIMIT 20
-    """, (text_search_query, text_search_query))
-    text_rows = c.fetchall()
-    
-    text_match_paths = [r['file_path'] for r in text_rows]
-    text_results_map = {r['file_path']: dict(r) for r in text_rows}
+    # 1. Full-text match over video transcripts / frame descriptions (FTS5 index)
+    text_hits = db.search_transcripts(query, limit=20)
+    snippets = dict(text_hits)
+    text_match_ids = [fid for fid, _ in text_hits]
 
     # 2. Extract Text Feature
-    text_vec = ai.extract_clip_text_feature(query)
+    text_vec = ai.encode_text_cached(query)
     
     # 3. Search in FAISS
     search_results = db.search_similar_images(text_vec, top_k=top_k)
     
     paths = [r[0] for r in search_results]
     scores = {r[0]: r[1] for r in search_results}
-    
-    # Merge paths, prioritizing exact text matches for videos
-    all_paths = list(text_match_paths)
-    for p in paths:
-        if p not in text_match_paths:
-            all_paths.append(p)
-    
-    if not all_paths:
-        conn.close()
+
+    if not text_match_ids and not paths:
         return []
         
-    # 4. Fetch Metadata for vector matches
-    paths_to_fetch = [p for p in all_paths if p not in text_results_map]
-    row_map = {**text_results_map}
+    # 4. Fetch metadata, ordered in SQL: exact text matches first, then vector rank
+    ranked = [(fid, None, i) for i, fid in enumerate(text_match_ids)]
+    ranked += [(None, p, len(text_match_ids) + i) for i, p in enumerate(paths)]
+    values = ','.join(['(?, ?, ?)'] * len(ranked))
+    ordered = db.get_conn().execute(f"""
+        WITH ranked(fid, fpath, ord) AS (VALUES {values})
+        SELECT {MEDIA_COLUMNS}, MIN(ranked.ord) AS ord
+        FROM ranked JOIN files ON files.id = ranked.fid OR files.file_path = ranked.fpath
+        GROUP BY files.id
+        ORDER BY ord
+        LIMIT ?
+    """, [v for row in ranked for v in row] + [top_k]).fetchall()
+
+    # Snippets for vector-matched videos that also contain the query text
+    missing = [r['id'] for r in ordered if r['media_type'] == 'video' and r['id'] not in snippets]
+    if missing:
+        snippets.update(db.search_transcripts(query, limit=len(missing), file_ids=missing))
     
-    if paths_to_fetch:
-        placeholders = ','.join(['?'] * len(paths_to_fetch))
-        c.execute(f"""
-            SELECT id, file_path, media_type, width, height, tags, character_tags, series_tags, audio_transcription, frame_descriptions
-            FROM files
-            WHERE file_path IN ({placeholders})
-        """, paths_to_fetch)
-        
-        faiss_rows = c.fetchall()
-        for r in faiss_rows:
-            row_map[r['file_path']] = dict(r)
-            
-    conn.close()
-    
-    # Re-sort match search
-    # Format results
-    results = []
-    
-    def extract_snippet(row_dict, q):
-        q_lower = q.lower()
-        if row_dict.get('audio_transcription'):
-            try:
-                audio_data = json.loads(row_dict['audio_transcription'])
-                for seg in audio_data:
-                    if q_lower in seg.get('text', '').lower():
-                        return f"[Audio @{seg['start']:.1f}s] {seg['text']}"
-            except:
-                pass
-        if row_dict.get('frame_descriptions'):
-            try:
-                frame_data = json.loads(row_dict['frame_descriptions'])
-                for seg in frame_data:
-                    if q_lower in seg.get('text', '').lower():
-                        return f"[Video @{seg['timestamp']:.1f}s] {seg['text']}"
-            except:
-                pass
-        return None
-
-    for path in all_paths:
-        if path in row_map:
-            r = row_map[path]
-            snippet = extract_snippet(r, query)
-            results.append(MediaItemResponse(
-                id=r['id'],
-                file_path=r['file_path'],
-                media_type=r['media_type'],
-                width=r['width'],
-                height=r['height'],
-                tags=json.loads(r['tags']) if r['tags'] else [],
-                character_tags=json.loads(r['character_tags']) if r['character_tags'] else [],
-                series_tags=json.loads(r['series_tags']) if r['series_tags'] else [],
-                score=scores.get(path, 1.0), # Give text matches 1.0 score by default
-                snippet=snippet
-            ))
-            
-    return results[:top_k]
+    return media_items_response(ordered, scores, snippets)
 
 @router.get("/filters")
 def get_filters(db: DBManager = Depends(get_db_manager)):
     """Get unique lists of characters and series for filtering."""
-    import sqlite3
-    conn = sqlite3.connect(db.sqlite_path)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    try:
-        c.execute("SELECT character_tags, series_tags FROM files WHERE is_processed=1")
-        rows = c.fetchall()
-        
-        all_chars = set()
-        all_series = set()
-        
-        for r in rows:
-            try:
-                if r['character_tags']:
-                    all_chars.update(json.loads(r['character_tags']))
-                if r['series_tags']:
-                    all_series.update(json.loads(r['series_tags']))
-            except:
-                pass
-                
-        return {
-            "characters": sorted(list(all_chars)),
-            "series": sorted(list(all_series))
-        }
-    finally:
-        conn.close()
+    return db.get_filter_names()
 
 class ChatRequest(BaseModel):
     file_path: str
     prompt: str
 
 @router.post("/chat")
-def chat_with_gallery(
-    request: ChatRequest,
-    background_tasks: BackgroundTasks,
-    vlm: 'VLMEngine' = Depends(lambda: __import__('server.dependencies', fromlist=['get_vlm_engine']).get_vlm_engine())
-):
+def chat_with_gallery(request: ChatRequest):
     """
-    Ask a question about a specific image using VLM.
+    Queue a question about a specific image for the VLM.
+    Returns a job id; poll GET /gallery/chat/{job_id} for the answer.
     """
     if not os.path.exists(request.file_path):
         raise HTTPException(status_code=404, detail="File not found")
-        
-    try:
-        from PIL import Image
-        img = None
-        
-        try:
-            # Try opening as image first
-            img = Image.open(request.file_path).convert("RGB")
-        except Exception:
-            # If it fails, assume it's a video and grab a frame
-            try:
-                import decord
-                vr = decord.VideoReader(request.file_path)
-                mid_frame = vr[len(vr)//2].asnumpy()
-                img = Image.fromarray(mid_frame).convert("RGB")
-            except ImportError:
-                 raise HTTPException(status_code=400, detail="decord is required for video VQA")
-            except Exception as e:
-                 raise HTTPException(status_code=400, detail=f"Failed to extract frame from video: {e}")
 
-        if img is not None:
-             answer = vlm.ask_image(img, request.prompt)
-             
-             # Schedule VRAM release
-             background_tasks.add_task(vlm.unload)
-             
-             return {"answer": answer}
-        else:
-             raise HTTPException(status_code=500, detail="Could not load media")
-             
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        return {"job_id": chat_queue.submit(request.file_path, request.prompt)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/chat/{job_id}")
+def get_chat_result(job_id: str):
+    """Status of a chat job: pending, done (with answer) or error."""
+    job = chat_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
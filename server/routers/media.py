@@ -1,24 +1,50 @@
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 import os
-import io
-from PIL import Image
 
 from ..dependencies import get_db_manager
 from src.data.db_manager import DBManager
+from src.core.thumbnails import THUMBNAIL_FORMATS, cache_path, negotiate_format, save_thumbnail, snap_size, thumbnail_bytes
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+# Thumbnail URLs are keyed by file id, not content: revalidate against the ETag
+# (cheap 304) so a reprocessed file's new thumbnail shows up
+THUMBNAIL_CACHE_CONTROL = "public, no-cache"
+ORIGINAL_CACHE_CONTROL = "public, max-age=86400"
+
+class LargeFileResponse(FileResponse):
+    """
+    FileResponse for originals (often multi-GB videos). Starlette already serves
+    Range requests and uses the ASGI pathsend extension (kernel sendfile) when the
+    server offers it; otherwise it reads through anyio's threadpool, where 1 MiB
+    chunks mean 16x fewer thread hops than the 64 KiB default.
+    """
+    chunk_size = 1024 * 1024
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+def _cached_file_response(request: Request, path: str, etag_prefix: str, cache_control: str,
+                          media_type=None, vary=None, response_class=FileResponse) -> Response:
+    """FileResponse with a weak ETag from the file's mtime; 304 when the client already has it."""
+    st = os.stat(path)
+    etag = f'W/"{etag_prefix}-{st.st_mtime_ns}-{st.st_size}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return response_class(path, media_type=media_type, headers=headers, stat_result=st)
+
 @router.get("/{file_id}/original")
-def get_original(file_id: int, db: DBManager = Depends(get_db_manager)):
+def get_original(file_id: int, request: Request, db: DBManager = Depends(get_db_manager)):
     """Serve the original file."""
-    import sqlite3
-    conn = sqlite3.connect(db.sqlite_path)
-    c = conn.cursor()
-    c.execute("SELECT file_path FROM files WHERE id = ?", (file_id,))
-    row = c.fetchone()
-    conn.close()
+    row = db.get_conn().execute("SELECT file_path FROM files WHERE id = ?", (file_id,)).fetchone()
     
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
@@ -27,82 +53,55 @@ def get_original(file_id: int, db: DBManager = Depends(get_db_manager)):
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File lost from disk")
         
-    return FileResponse(path)
+    return _cached_file_response(request, path, str(file_id), ORIGINAL_CACHE_CONTROL,
+                                 response_class=LargeFileResponse)
 
 @router.get("/{file_id}/thumbnail")
-def get_thumbnail(file_id: int, size: int = 300, db: DBManager = Depends(get_db_manager)):
+def get_thumbnail(file_id: int, request: Request, size: int = 300, db: DBManager = Depends(get_db_manager)):
     """Serve a resized thumbnail."""
-    import sqlite3
-    conn = sqlite3.connect(db.sqlite_path)
-    c = conn.cursor()
-    c.execute("SELECT file_path, media_type FROM files WHERE id = ?", (file_id,))
-    row = c.fetchone()
-    conn.close()
+    # Serve the nearest pre-generated pyramid step at or above the requested size
+    size = snap_size(size)
+
+    # AVIF/WebP when the browser accepts them, JPEG otherwise
+    fmt = negotiate_format(request.headers.get("accept"))
+    ext, mime = THUMBNAIL_FORMATS[fmt]
+
+    # Cached thumbnails (normally pre-generated at ingest) are served without touching SQLite
+    cache_dir = os.path.join(os.path.dirname(db.sqlite_path), ".thumbnails")
+    thumb_path = cache_path(cache_dir, file_id, size, fmt)
+    etag_prefix = f"{file_id}-{size}-{ext}"
+    if os.path.exists(thumb_path):
+        return _cached_file_response(request, thumb_path, etag_prefix, THUMBNAIL_CACHE_CONTROL, mime, "Accept")
+
+    # Pyramid written before this format was negotiable: every client takes the JPEG one
+    jpeg_path = cache_path(cache_dir, file_id, size, 'jpeg')
+    if fmt != 'jpeg' and os.path.exists(jpeg_path):
+        jpeg_ext, jpeg_mime = THUMBNAIL_FORMATS['jpeg']
+        return _cached_file_response(request, jpeg_path, f"{file_id}-{size}-{jpeg_ext}",
+                                     THUMBNAIL_CACHE_CONTROL, jpeg_mime, "Accept")
+
+    row = db.get_conn().execute("SELECT file_path, media_type, duration FROM files WHERE id = ?", (file_id,)).fetchone()
     
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
         
-    path, media_type = row
+    path, media_type, duration = row
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File lost from disk")
         
     try:
-        # Check if requested size is reasonable
-        size = min(max(size, 100), 1080)
-        
-        # Check Cache Directory
-        cache_dir = os.path.join(os.path.dirname(db.sqlite_path), ".thumbnails")
         os.makedirs(cache_dir, exist_ok=True)
-        cache_path = os.path.join(cache_dir, f"{file_id}_{size}.jpg")
-        
-        if os.path.exists(cache_path):
-            return FileResponse(cache_path, media_type="image/jpeg")
-        
-        img = None
-        
-        if media_type == 'video':
-            try:
-                import decord
-                # Attempt to extract the mid frame
-                vr = decord.VideoReader(path)
-                mid_frame = vr[len(vr)//2].asnumpy()
-                img = Image.fromarray(mid_frame).convert("RGB")
-            except Exception as e:
-                print(f"Video Thumbnail Error for {path}: {e}")
-                # Fallback to a black image if video decoding fails
-                img = Image.new('RGB', (size, size), color=(20, 20, 20))
-        else:
-            try:
-                img = Image.open(path)
-                # Convert to RGB to ensure JPEG compatibility
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-            except Exception as e:
-                print(f"Image load Error for {path}: {e}")
-                # Fallback to a black image
-                img = Image.new('RGB', (size, size), color=(20, 20, 20))
 
-        if img is not None:
-             img.thumbnail((size, size)) # Preserves aspect ratio
-             
-             # Save to Cache and return it
-             try:
-                 rgb_img = img.convert('RGB')
-                 temp_path = f"{cache_path}.{os.getpid()}.tmp"
-                 rgb_img.save(temp_path, format="JPEG", quality=85)
-                 os.replace(temp_path, cache_path)
-                 return FileResponse(cache_path, media_type="image/jpeg")
-             except Exception as e:
-                 print(f"Failed to cache thumbnail: {e}")
-                 # Fallback to streaming memory
-                 buf = io.BytesIO()
-                 img.save(buf, format="JPEG", quality=85)
-                 buf.seek(0)
-                 return StreamingResponse(buf, media_type="image/jpeg")
-        else:
-             raise HTTPException(status_code=500, detail="Could not generate thumbnail")
-             
+        try:
+            # Cold path: generate this size on the request thread
+            save_thumbnail(path, media_type, size, thumb_path, duration, fmt)
+            return _cached_file_response(request, thumb_path, etag_prefix, THUMBNAIL_CACHE_CONTROL, mime, "Accept")
+        except OSError as e:
+            print(f"Failed to cache thumbnail: {e}")
+            # Fallback to an in-memory render
+            return Response(thumbnail_bytes(path, media_type, size, duration, fmt), media_type=mime,
+                            headers={"Vary": "Accept"})
+
     except Exception as e:
         print(f"Thumbnail Error: {e}")
         raise HTTPException(status_code=500, detail="Thumbnail generation failed")
-
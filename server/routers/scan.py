@@ -1,26 +1,36 @@
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import asyncio
 import os
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 from ..dependencies import get_processor
-from ..state import current_status, ScanStatus
-from src.core.processor import Processor
+from ..state import current_status, ScanStatusResponse
+
+if TYPE_CHECKING:
+    from src.core.processor import Processor
 
 router = APIRouter(prefix="/scan", tags=["scan"])
 
+# Scans get their own thread instead of occupying FastAPI's shared default pool
+SCAN_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan")
+
 class ScanRequest(BaseModel):
     target_path: str
     force_reprocess: bool = False
 
-async def run_scan_task(target_path: str, force_reprocess: bool, processor: Processor):
+async def run_scan_task(target_path: str, force_reprocess: bool, processor: 'Processor'):
     """Background task to run the scan."""
     global current_status
     current_status.is_active = True
     current_status.error = None
     current_status.processed_count = 0
     current_status.total_files = 0
+    current_status.total_final = False
     current_status.progress_percent = 0.0
 
     print(f"Starting scan for: {target_path}")
@@ -38,37 +48,32 @@ async def run_scan_task(target_path: str, force_reprocess: bool, processor: Proc
         # We MUST run this in a thread.
         
         # Helper to run blocking loop in thread
-        import concurrent.futures
         loop = asyncio.get_running_loop()
         
+        def _on_progress(current: int, total: int, filename: str, newly: int, eta: float, total_final: bool):
+            # Plain slot stores on the ScanStatus dataclass; no per-file dict from the producer
+            current_status.processed_count = newly
+            current_status.total_files = total
+            current_status.total_final = total_final
+            current_status.current_file = filename
+            current_status.eta_seconds = eta
+            current_status.progress_percent = (current / total) * 100 if total > 0 else 0
+        
         def _scan_loop():
-            # Since we modify global state, and strings/ints are immutable (replaced), it should be fine?
-            # Global variable assignment is atomic for reference update in CPython usually.
-            # But better to be safe.
-            # Actually, `current_status` is an object (Pydantic model). 
-            # Updating its fields is thread-safe enough for simple status display.
-            
-            for status in processor.process_folder(target_path, force_reprocess=force_reprocess):
+            # Only coarse events ('error' / 'complete') are yielded; progress arrives via the callback
+            for status in processor.process_folder(target_path, force_reprocess=force_reprocess, status_cb=_on_progress):
                 if 'error' in status:
                      current_status.error = status['error']
                      # Don't break? Continue?
                      continue
                 
                 if 'status' in status and status['status'] == 'complete':
+                    # Progress is rate-limited, so the last per-file update may have been skipped
+                    _on_progress(status['scanned'], status['scanned'], current_status.current_file,
+                                 status['processed'], 0.0, True)
                     break
-                    
-                # Update status
-                current = status.get('current', 0)
-                total = status.get('total', 1)
-                
-                current_status.processed_count = status.get('newly_processed', 0)
-                current_status.total_files = total
-                current_status.current_file = status.get('filename', '')
-                current_status.eta_seconds = status.get('eta', 0.0)
-                current_status.progress_percent = (current / total) * 100 if total > 0 else 0
                 
-        # Run in default executor
-        await loop.run_in_executor(None, _scan_loop)
+        await loop.run_in_executor(SCAN_EXECUTOR, _scan_loop)
         
     except Exception as e:
         current_status.error = str(e)
@@ -81,7 +86,7 @@ async def run_scan_task(target_path: str, force_reprocess: bool, processor: Proc
 async def start_scan(
     req: ScanRequest, 
     background_tasks: BackgroundTasks,
-    processor: Processor = Depends(get_processor)
+    processor: 'Processor' = Depends(get_processor)
 ):
     """Start scanning a directory."""
     if current_status.is_active:
@@ -93,9 +98,10 @@ async def start_scan(
     # Add task
     background_tasks.add_task(run_scan_task, req.target_path, req.force_reprocess, processor)
     
-    return {"message": "Scan started", "status": current_status}
+    return {"message": "Scan started", "status": asdict(current_status)}
 
-@router.get("/status", response_model=ScanStatus)
+@router.get("/status", response_model=ScanStatusResponse)
 def get_status():
     """Get current scan status."""
-    return current_status
+    # Returned as a Response so the dataclass isn't re-validated through the model on every poll
+    return ORJSONResponse(asdict(current_status))
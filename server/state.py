@@ -1,13 +1,27 @@
-
+from dataclasses import dataclass
 from pydantic import BaseModel
 from typing import Optional
 
-class ScanStatus(BaseModel):
+@dataclass(slots=True)
+class ScanStatus:
+    """Live scan progress. Mutated from the scan thread, so a plain slotted dataclass (no validation on set)."""
+    is_active: bool = False
+    progress_percent: float = 0.0
+    current_file: str = ""
+    processed_count: int = 0
+    total_files: int = 0
+    total_final: bool = True # False while the directory walk is still counting
+    eta_seconds: float = 0.0
+    error: Optional[str] = None
+
+class ScanStatusResponse(BaseModel):
+    """OpenAPI schema for ScanStatus."""
     is_active: bool = False
     progress_percent: float = 0.0
     current_file: str = ""
     processed_count: int = 0
     total_files: int = 0
+    total_final: bool = True # False while the directory walk is still counting
     eta_seconds: float = 0.0
     error: Optional[str] = None
 
@@ -9,11 +9,49 @@ class Config:
     # Input/Scanning
     DEFAULT_INPUT_DIR = "data/inputs"
     ALLOWED_EXTENSIONS = {
-        'image': ['.jpg', '.jpeg', '.png', '.webp', '.bmp'],
-        'video': ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+        'image': frozenset({'.jpg', '.jpeg', '.png', '.webp', '.bmp'}),
+        'video': frozenset({'.mp4', '.avi', '.mov', '.mkv', '.webm'})
     }
+    # Single "is media?" gate for the scan walker
+    ALL_MEDIA_EXTS = ALLOWED_EXTENSIONS['image'] | ALLOWED_EXTENSIONS['video']
     
     # AI Models
+    # torch.compile the CLIP image encoder on CUDA (needs triton; skipped otherwise)
+    COMPILE_CLIP = True
+    # INT8 dynamic quantization of the CLIP text transformer on the CPU fallback
+    # (the CUDA path already runs the text encoder in fp16)
+    QUANTIZE_CLIP_TEXT = True
+    # TensorRT engine for the CLIP image tower (built by scripts/export_clip_trt.py);
+    # batch encodes use it when present and tensorrt is installed
+    CLIP_TRT_ENGINE = "data/models/clip_vit_l14_fp16.trt"
+    # ArcFace runs on onnxruntime's TensorRT provider (FP16) when available;
+    # built engines are cached here so only the first start pays for the build
+    FACE_TRT_CACHE_DIR = "data/trt_cache"
+    # Mirror the CLIP FAISS index onto the GPU for search when one is available
+    USE_GPU_FAISS = True
+    # Approximate CLIP search (IVF-PQ fast-scan) once the library reaches this size;
+    # the flat index stays canonical and is used to re-rank the ANN candidates
+    CLIP_ANN_MIN_VECTORS = 20000
+    CLIP_ANN_FACTORY = "IVF256,PQ32x4fsr"
+    CLIP_ANN_NPROBE = 16
+    CLIP_ANN_RERANK = 4  # candidates fetched per result for exact re-ranking
+
+    # Scanning
+    # Threads listing directories concurrently during a scan; 1 walks sequentially
+    # (better for spinning disks, where concurrent listing just adds seeks)
+    SCAN_WORKERS = 4
+    # Threads reading file heads/tails for fingerprints during inspection
+    FINGERPRINT_WORKERS = 8
+
+    # Thumbnails
+    # Worker processes that pre-generate the thumbnail pyramid at ingest
+    THUMBNAIL_WORKERS = 2
+    # Worker processes that decode image batches (PIL holds the GIL for parts of a decode)
+    DECODE_WORKERS = max(2, (os.cpu_count() or 4) // 2)
+    # Batch decodes let libjpeg downscale large JPEGs while keeping the short side at
+    # least this big: above CLIP (224), the tagger (448) and the face detector (640)
+    DECODE_MIN_SIDE = 720
+
     # Thresholds
     CLUSTERING_EPS = 0.65
     CLUSTERING_MIN_SAMPLES = 4
@@ -1,10 +1,23 @@
 
+import contextlib
+import json
 import os
+import subprocess
+import sys
+import threading
+import unicodedata
 import torch
 import open_clip
 import numpy as np
+import onnxruntime as ort
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache
 from PIL import Image
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
+from .text_embed_cache import TextEmbeddingCache
+from ..config import Config
+from ..data.schemas import FaceBatch
 from typing import List, Optional, Tuple, Union, Dict, Any
 
 try:
@@ -13,6 +26,57 @@ try:
 except ImportError:
     HAS_WHISPER = False
 
+try:
+    import tensorrt as trt
+    HAS_TRT = True
+except ImportError:
+    HAS_TRT = False
+
+# Largest ArcFace batch: the TensorRT optimization profile's max, and the slice size
+# extract_face_features_batch feeds get_feat (a batch of group shots can hold far more faces)
+FACE_REC_MAX_BATCH = 64
+
+class TrtClipRunner:
+    """
+    TensorRT engine for the CLIP visual tower, built offline by scripts/export_clip_trt.py.
+    Drop-in for clip_model.encode_image: (B, 3, 224, 224) CUDA tensor -> (B, 768) tensor.
+    """
+    def __init__(self, engine_path: str):
+        logger = trt.Logger(trt.Logger.WARNING)
+        with open(engine_path, 'rb') as f, trt.Runtime(logger) as runtime:
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        if self.engine is None:
+            raise RuntimeError(f"Could not deserialize TensorRT engine: {engine_path}")
+        self.context = self.engine.create_execution_context()
+
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        self.input_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT)
+        self.output_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT)
+        self.input_dtype = self._torch_dtype(self.engine.get_tensor_dtype(self.input_name))
+        self.output_dtype = self._torch_dtype(self.engine.get_tensor_dtype(self.output_name))
+        # (min, opt, max) shapes of optimization profile 0
+        self.max_batch = self.engine.get_tensor_profile_shape(self.input_name, 0)[2][0]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _torch_dtype(dtype) -> torch.dtype:
+        return torch.float16 if dtype == trt.DataType.HALF else torch.float32
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.cat([self._run(chunk) for chunk in x.split(self.max_batch)])
+
+    def _run(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.to(self.input_dtype).contiguous()  # engine bindings are plain NCHW
+        with self._lock:
+            self.context.set_input_shape(self.input_name, tuple(x.shape))
+            out = torch.empty(tuple(self.context.get_tensor_shape(self.output_name)),
+                              dtype=self.output_dtype, device=x.device)
+            self.context.set_tensor_address(self.input_name, x.data_ptr())
+            self.context.set_tensor_address(self.output_name, out.data_ptr())
+            # Enqueue on the caller's stream so ordering with the surrounding torch ops holds
+            self.context.execute_async_v3(torch.cuda.current_stream().cuda_stream)
+        return out
+
 class AIEngine:
     _instance = None
     
@@ -32,6 +96,15 @@ class AIEngine:
         if self.device == "cpu":
             print("WARNING: CUDA is not available. Performance will be significantly degraded.")
 
+        # FP16 autocast for tensor cores on CUDA; autocast on CPU is pure overhead
+        if self.device == "cuda":
+            self._amp_ctx = lambda: torch.autocast("cuda", dtype=torch.float16)
+        else:
+            self._amp_ctx = contextlib.nullcontext
+
+        # CLIP preprocessing (PIL resize/normalize) releases the GIL; spread it over cores
+        self._prep_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
         # --- 1. Load CLIP Model ---
         print("Loading CLIP model (ViT-L-14 / laion2b_s32b_b82k)...")
         try:
@@ -41,6 +114,28 @@ class AIEngine:
                 device=self.device
             )
             self.clip_model.eval() # Inference mode
+            # fp16 weights use the tensor cores directly; inputs are cast to match
+            self.clip_dtype = torch.float16 if self.device == "cuda" else torch.float32
+            if self.device == "cuda":
+                self.clip_model = self.clip_model.half()
+                self._compile_clip_image_encoder()
+            self.clip_trt = self._load_clip_trt()
+            # Normalization constants for the on-device preprocess of decoded frames
+            mean = getattr(self.clip_model.visual, 'image_mean', None) or open_clip.OPENAI_DATASET_MEAN
+            std = getattr(self.clip_model.visual, 'image_std', None) or open_clip.OPENAI_DATASET_STD
+            self._clip_mean = torch.tensor(mean, device=self.device).view(1, 3, 1, 1)
+            self._clip_std = torch.tensor(std, device=self.device).view(1, 3, 1, 1)
+            self.text_quant = self.device == "cpu" and Config.QUANTIZE_CLIP_TEXT
+            if self.text_quant:
+                self._quantize_clip_text_encoder()
+            # Parsing the BPE vocab is slow; keep one tokenizer for all text encodes
+            self.clip_tokenizer = open_clip.get_tokenizer('ViT-L-14')
+            # Text embeddings persist across runs (queries and the fixed style prompts);
+            # quantized encodes are keyed separately so the two never mix
+            text_model_id = 'ViT-L-14/laion2b_s32b_b82k' + ('/int8' if self.text_quant else '')
+            self.text_embed_cache = TextEmbeddingCache(
+                os.path.join(Config.DB_DIR, "text_embeddings.db"), text_model_id, 768
+            )
             print("CLIP model loaded successfully.")
         except Exception as e:
             print(f"Failed to load CLIP model: {e}")
@@ -55,6 +150,11 @@ class AIEngine:
             self.face_app = FaceAnalysis(name='buffalo_l', providers=providers)
             # ctx_id=0 for GPU 0, det_size=(640, 640) can be adjusted if needed
             self.face_app.prepare(ctx_id=0, det_size=(640, 640))
+            # Batch path drives detection and ArcFace recognition directly
+            self.det = self.face_app.det_model
+            self.rec = self.face_app.models['recognition']
+            if self.device == "cuda":
+                self._use_trt_for_face_rec()
             print("InsightFace model loaded successfully.")
         except Exception as e:
             print(f"Failed to load InsightFace model: {e}")
@@ -65,108 +165,292 @@ class AIEngine:
         self.style_prompts = ["anime illustration", "digital art", "sketch", "manga", "comic", "monochrome illustration", "lineart", "japanese comic"]
         self.photo_prompts = ["photo", "realistic", "live action", "color photograph", "real world photo", "realistic photo", "live action movie frame"]
         
-        with torch.no_grad():
-             style_tokens = open_clip.tokenize(self.style_prompts).to(self.device)
-             photo_tokens = open_clip.tokenize(self.photo_prompts).to(self.device)
-             
-             self.style_embs = self.clip_model.encode_text(style_tokens)
-             self.style_embs /= self.style_embs.norm(dim=-1, keepdim=True)
-             self.style_mean = self.style_embs.mean(dim=0, keepdim=True)
-             self.style_mean /= self.style_mean.norm(dim=-1, keepdim=True)
-
-             self.photo_embs = self.clip_model.encode_text(photo_tokens)
-             self.photo_embs /= self.photo_embs.norm(dim=-1, keepdim=True)
-             self.photo_mean = self.photo_embs.mean(dim=0, keepdim=True)
-             self.photo_mean /= self.photo_mean.norm(dim=-1, keepdim=True)
-
-        # --- 4. Whisper Model ---
+        with torch.inference_mode():
+             self.style_mean = self._prompt_mean(self.style_prompts)
+             self.photo_mean = self._prompt_mean(self.photo_prompts)
+
+             # Only sign(photo score - style score) matters: classify with one dot product
+             self.decision_dir = (self.photo_mean - self.style_mean).squeeze(0)
+             self.decision_dir_np = self.decision_dir.float().cpu().numpy()
+
+        # --- 4. Search-path text encoding ---
+        # A dedicated stream and a reusable pinned host buffer keep per-query encodes
+        # off the default stream and avoid pageable device->host copies.
+        self._text_lock = threading.Lock()
+        # Query embeddings memoized by normalized text (see encode_text_cached)
+        self._text_cache = LRUCache(maxsize=1024)
+        self._text_cache_lock = threading.Lock()
+        self.text_stream = None
+        self._text_pinned = None
+        if self.device == "cuda":
+            self.text_stream = torch.cuda.Stream()
+            self._text_pinned = torch.empty(self.decision_dir.shape[-1], dtype=torch.float32, pin_memory=True)
+            self._encode_text("warmup")
+
+        # --- 5. Batch image encoding ---
+        # Preprocessed batches are staged in a reusable pinned host buffer (grown on
+        # demand) and copied asynchronously on their own stream.
+        self._batch_lock = threading.Lock()
+        self.image_stream = torch.cuda.Stream() if self.device == "cuda" else None
+        self._batch_pinned = None
+
+        # --- 6. Whisper Model ---
         # NOTE: Whisper (ctranslate2) is run in a subprocess to avoid DLL conflicts
-        # with onnxruntime-gpu. No model is loaded here.
+        # with onnxruntime-gpu. One persistent worker (src/core/whisper_worker.py) is
+        # started on first use and keeps the model loaded between files.
+        self._whisper_proc = None
+        self._whisper_lock = threading.Lock()
 
         self._initialized = True
 
+    def _compile_clip_image_encoder(self):
+        """
+        Compile encode_image with Inductor (kernel fusion) and warm it up.
+        Compiled with a dynamic batch dimension and without CUDA graphs: callers on
+        several threads use varying batch sizes, which would recapture a graph per size
+        and share graph output buffers between threads.
+        Falls back to eager mode when disabled, triton is missing (e.g. Windows wheels)
+        or compilation fails.
+        """
+        if not Config.COMPILE_CLIP:
+            return
+        try:
+            import triton  # noqa: F401  (Inductor's GPU backend)
+        except ImportError:
+            print("triton not installed; CLIP image encoder runs in eager mode.")
+            return
+
+        eager = self.clip_model.encode_image
+        try:
+            self.clip_model.encode_image = torch.compile(eager, dynamic=True, fullgraph=False)
+            # Batch 1 is specialized separately from the dynamic-batch graph; warm up both
+            with torch.inference_mode():
+                for batch in (1, 2):
+                    dummy = torch.zeros((batch, 3, 224, 224), device=self.device, dtype=self.clip_dtype)
+                    self.clip_model.encode_image(dummy.contiguous(memory_format=torch.channels_last))
+        except Exception as e:
+            print(f"torch.compile failed, using eager CLIP image encoder: {e}")
+            self.clip_model.encode_image = eager
+
+    def _quantize_clip_text_encoder(self):
+        """
+        INT8 dynamic quantization of the text transformer's Linear layers (CPU only).
+        Batch-1 query encodes are memory-bound, so int8 weights roughly halve latency.
+        The image tower (clip_model.visual) is left untouched.
+        """
+        try:
+            self.clip_model.transformer = torch.ao.quantization.quantize_dynamic(
+                self.clip_model.transformer, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        except Exception as e:
+            print(f"CLIP text quantization failed, using fp32: {e}")
+            self.text_quant = False
+
+    def _use_trt_for_face_rec(self):
+        """
+        Rebuild the ArcFace session on TensorRT FP16 with a dynamic batch profile.
+        Only recognition is moved: the detector's input is also named 'input.1' but is
+        640x640, so FaceAnalysis-wide providers can't carry these shapes.
+        """
+        if 'TensorrtExecutionProvider' not in ort.get_available_providers():
+            return
+        name = self.rec.input_name
+        size = self.rec.input_size[0]
+        shape = lambda b: f"{name}:{b}x3x{size}x{size}"
+        os.makedirs(Config.FACE_TRT_CACHE_DIR, exist_ok=True)
+        trt_options = {
+            'trt_fp16_enable': True,
+            'trt_engine_cache_enable': True,
+            'trt_engine_cache_path': Config.FACE_TRT_CACHE_DIR,
+            'trt_profile_min_shapes': shape(1),
+            'trt_profile_opt_shapes': shape(16),
+            'trt_profile_max_shapes': shape(FACE_REC_MAX_BATCH),
+        }
+        try:
+            self.rec.session = ort.InferenceSession(
+                self.rec.model_file,
+                providers=[('TensorrtExecutionProvider', trt_options), 'CUDAExecutionProvider', 'CPUExecutionProvider'],
+            )
+            print("ArcFace running on TensorrtExecutionProvider (FP16).")
+        except Exception as e:
+            print(f"TensorRT provider unavailable for ArcFace, keeping CUDA: {e}")
+
+    def _load_clip_trt(self) -> Optional[TrtClipRunner]:
+        """TensorRT runner for batch image encodes, or None to stay on the torch path."""
+        if self.device != "cuda" or not HAS_TRT or not os.path.exists(Config.CLIP_TRT_ENGINE):
+            return None
+        try:
+            runner = TrtClipRunner(Config.CLIP_TRT_ENGINE)
+            print(f"Using TensorRT CLIP image engine: {Config.CLIP_TRT_ENGINE}")
+            return runner
+        except Exception as e:
+            print(f"Failed to load TensorRT CLIP engine, using torch: {e}")
+            return None
+
     def classify_style(self, image: Image.Image) -> str:
         """
         Returns 'illustration' or 'photo' using zero-shot classification.
         """
-        img_features = self.extract_clip_feature(image) # Returns numpy (1, dim)
-        img_vec = torch.from_numpy(img_features).to(self.device).to(self.style_mean.dtype)
-        
-        # Compare cosine similarity with mean vectors
-        # Shape: (1, dim) @ (dim, 1) -> (1, 1)
-        score_anime = (img_vec @ self.style_mean.T).item()
-        score_photo = (img_vec @ self.photo_mean.T).item()
+        # Stay on device: no GPU -> numpy -> GPU round-trip for a single dot product
+        img_vec = self._encode_image_gpu(image)[0].to(self.decision_dir.dtype)
         
-        if score_photo > score_anime:
+        # photo_mean·v - style_mean·v == (photo_mean - style_mean)·v
+        if float(img_vec @ self.decision_dir) > 0:
             return "photo"
         return "illustration"
 
+    def _encode_image_gpu(self, image: Image.Image) -> torch.Tensor:
+        """
+        Normalized CLIP image embedding as a (1, 768) tensor left on self.device.
+        """
+        # Preprocess and move to device
+        image_tensor = self.clip_preprocess(image).unsqueeze(0).to(self.device, dtype=self.clip_dtype)
+        image_tensor = image_tensor.contiguous(memory_format=torch.channels_last)
+        
+        with torch.inference_mode():
+            image_features = self.clip_model.encode_image(image_tensor)
+            image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
+        return image_features
+
     def extract_clip_feature(self, image: Image.Image) -> np.ndarray:
         """
         Extract CLIP image embedding.
         Returns a normalized numpy array of shape (768,).
         """
         try:
-            # Preprocess and move to device
-            image_tensor = self.clip_preprocess(image).unsqueeze(0).to(self.device)
-            
-            with torch.no_grad(), torch.cuda.amp.autocast():
-                image_features = self.clip_model.encode_image(image_tensor)
-                image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
-
-            return image_features.cpu().numpy().flatten()
+            return self._encode_image_gpu(image).float().cpu().numpy().flatten()
         except Exception as e:
             print(f"Error in extract_clip_feature: {e}")
             return np.zeros(768, dtype=np.float32) # Return zero vector on error
 
+    def _gpu_preprocess(self, frames: np.ndarray, size: int = 224) -> torch.Tensor:
+        """
+        clip_preprocess for already-decoded RGB uint8 arrays, (H, W, 3) or (N, H, W, 3),
+        done with torch ops on self.device: shortest-side bicubic resize, center crop,
+        normalize. Skips the single-threaded PIL round-trip.
+        """
+        x = torch.from_numpy(np.ascontiguousarray(frames))
+        if x.ndim == 3:
+            x = x.unsqueeze(0)
+        x = x.to(self.device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255)
+
+        h, w = x.shape[-2:]
+        scale = size / min(h, w)
+        out_h, out_w = max(size, round(h * scale)), max(size, round(w * scale))
+        x = torch.nn.functional.interpolate(x, size=(out_h, out_w), mode='bicubic', antialias=True, align_corners=False)
+        top, left = (out_h - size) // 2, (out_w - size) // 2
+        x = x[:, :, top:top + size, left:left + size].clamp_(0, 1)  # bicubic overshoot, as PIL's uint8 output
+
+        x = (x - self._clip_mean) / self._clip_std
+        return x.to(self.clip_dtype).contiguous(memory_format=torch.channels_last)
+
+    def extract_clip_features_np(self, frames: np.ndarray) -> np.ndarray:
+        """
+        CLIP embeddings for decoded RGB uint8 frames of one size (e.g. a video's keyframes),
+        preprocessed on the device. Returns: numpy array of shape (N, 768)
+        """
+        n = 1 if frames.ndim == 3 else len(frames)
+        try:
+            with torch.inference_mode():
+                batch_tensor = self._gpu_preprocess(frames)
+                encode_image = self.clip_trt or self.clip_model.encode_image
+                image_features = encode_image(batch_tensor)
+                image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
+            return image_features.float().cpu().numpy()
+        except Exception as e:
+            print(f"Error in extract_clip_features_np: {e}")
+            return np.zeros((n, 768), dtype=np.float32)
+
+    def encode_text_cached(self, text: str) -> np.ndarray:
+        """
+        extract_clip_text_feature memoized on the NFKC-normalized, lowercased,
+        whitespace-collapsed query (the CLIP tokenizer lowercases anyway).
+        Returned arrays are shared and read-only.
+        """
+        key = ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+        with self._text_cache_lock:
+            vec = self._text_cache.get(key)
+        if vec is not None:
+            return vec
+
+        vec = self.extract_clip_text_feature(key)
+        if vec.any():  # don't memoize the zero vector returned on errors
+            vec.setflags(write=False)
+            with self._text_cache_lock:
+                self._text_cache[key] = vec
+        return vec
+
+    def encode_prompts(self, prompts: List[str]) -> np.ndarray:
+        """
+        Normalized (N, 768) float32 embeddings for a fixed prompt list, via the persistent
+        cache: a warm start reads them back, misses are encoded in one batch.
+        """
+        cached = self.text_embed_cache.get_many(prompts)
+        missing = list(dict.fromkeys(p for p in prompts if p not in cached)) # one forward row per distinct prompt
+        if missing:
+            with torch.inference_mode():
+                embs = self.clip_model.encode_text(self.clip_tokenizer(missing).to(self.device))
+                embs /= embs.norm(dim=-1, keepdim=True)
+            new = dict(zip(missing, embs.float().cpu().numpy()))
+            self.text_embed_cache.put_many(new)
+            cached.update(new)
+        return np.stack([cached[p] for p in prompts])
+
+    def _encode_prompts(self, prompts: List[str]) -> torch.Tensor:
+        """encode_prompts as a tensor on self.device."""
+        return torch.from_numpy(self.encode_prompts(prompts)).to(self.device)
+
+    def _prompt_mean(self, prompts: List[str]) -> torch.Tensor:
+        """Normalized mean of the prompts' normalized embeddings, (1, 768). The per-prompt matrix is not kept."""
+        mean = self._encode_prompts(prompts).mean(dim=0, keepdim=True)
+        return torch.nn.functional.normalize(mean, dim=-1)
+
     def extract_clip_text_feature(self, text: str) -> np.ndarray:
         """
         Extract CLIP text embedding for search queries.
         Returns a normalized numpy array of shape (768,).
+        Served from the on-disk text embedding cache when this text was encoded before.
         """
+        vec = self.text_embed_cache.get(text)
+        if vec is not None:
+            return vec
+        vec = self._encode_text(text)
+        if vec.any():  # zero vector means the encode failed
+            self.text_embed_cache.put(text, vec)
+        return vec
+
+    def _encode_text(self, text: str) -> np.ndarray:
+        """Run the CLIP text encoder for one string (no caching)."""
         try:
-            tokenizer = open_clip.get_tokenizer('ViT-L-14')
-            text_tensor = tokenizer([text]).to(self.device)
+            text_tensor = self.clip_tokenizer([text])
 
-            with torch.no_grad(), torch.cuda.amp.autocast():
-                text_features = self.clip_model.encode_text(text_tensor)
-                text_features /= text_features.norm(dim=-1, keepdim=True)
-            
-            return text_features.cpu().numpy().flatten()
+            if self.text_stream is None:
+                with torch.inference_mode(), self._amp_ctx():
+                    text_features = self.clip_model.encode_text(text_tensor.to(self.device))
+                    text_features /= text_features.norm(dim=-1, keepdim=True)
+                return text_features.cpu().numpy().flatten()
+
+            # Requests run on a threadpool; the pinned buffer is shared
+            with self._text_lock:
+                with torch.inference_mode(), torch.cuda.stream(self.text_stream), self._amp_ctx():
+                    text_features = self.clip_model.encode_text(text_tensor.to(self.device, non_blocking=True))
+                    text_features /= text_features.norm(dim=-1, keepdim=True)
+                    self._text_pinned.copy_(text_features[0], non_blocking=True)
+                self.text_stream.synchronize()
+                return self._text_pinned.numpy().copy()
         except Exception as e:
             print(f"Error in extract_clip_text_feature: {e}")
             return np.zeros(768, dtype=np.float32)
 
-    def extract_face_features(self, image_np: np.ndarray) -> List[dict]:
+    def extract_face_features(self, image_np: np.ndarray) -> FaceBatch:
         """
         Extract face features using InsightFace.
-        Input: numpy array (OpenCV format: BGR). If RGB, convert before calling or wrapper will handle if PIL provided?
-        InsightFace expects BGR usually if read by cv2. 
-        Note: If passing PIL image converted to np array, it is RGB. InsightFace expects BGR/RGB? 
-        The FaceAnalysis.get() method typically expects BGR numpy array (cv2.imread style).
+        Input: numpy array (OpenCV format: BGR). InsightFace expects BGR (cv2.imread style),
+        so convert PIL/RGB arrays before calling.
         
-        Returns: List of dicts containing 'bbox', 'kps', 'det_score', 'embedding' (512,).
+        Returns: FaceBatch of parallel bbox / kps / score / embedding (512,) arrays.
         """
-        try:
-            # InsightFace expects BGR images.
-            # If the input appears to be RGB (e.g. from PIL), we might need to swap channels if strictly required.
-            # However, typically simple detection works, but embeddings might be affected if color space is wrong.
-            # Assuming the caller provides BGR or we handle conversion if we standardized on PIL elsewhere.
-            # For this method, let's assume input is BGR numpy array as per standard cv2.
-            
-            faces = self.face_app.get(image_np)
-            results = []
-            for face in faces:
-                results.append({
-                    'bbox': face.bbox.astype(int).tolist(),
-                    'det_score': float(face.det_score),
-                    'embedding': face.embedding, # 512D numpy array
-                    'kps': face.kps.astype(int).tolist() # Landmarks
-                })
-            return results
-        except Exception as e:
-            print(f"Error in extract_face_features: {e}")
-            return []
+        return self.extract_face_features_batch([image_np])[0]
 
     def extract_clip_features_batch(self, images: List[Image.Image]) -> np.ndarray:
         """
@@ -180,35 +464,113 @@ class AIEngine:
             # Preprocess all images and stack into a tensor
             # self.clip_preprocess returns (3, 224, 224)
             # torch.stack will make it (N, 3, 224, 224)
-            tensors = [self.clip_preprocess(img) for img in images]
-            batch_tensor = torch.stack(tensors).to(self.device)
-            
-            with torch.no_grad(), torch.cuda.amp.autocast():
-                image_features = self.clip_model.encode_image(batch_tensor)
-                image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
+            tensors = list(self._prep_pool.map(self.clip_preprocess, images))
+            if self.image_stream is None:
+                batch_tensor = torch.stack(tensors).to(self.device)
+                with torch.inference_mode():
+                    image_features = self.clip_model.encode_image(batch_tensor)
+                    image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
+                return image_features.cpu().numpy() # (N, 768)
 
-            return image_features.cpu().numpy() # (N, 768)
+            # The pinned buffer is shared; a batch owns it until its results are back on the host
+            with self._batch_lock, torch.cuda.stream(self.image_stream):
+                batch_tensor = self._stage_batch(tensors).to(self.device, non_blocking=True)
+                batch_tensor = batch_tensor.contiguous(memory_format=torch.channels_last)
+                
+                encode_image = self.clip_trt or self.clip_model.encode_image
+                # Weights are already fp16 on CUDA; no autocast needed
+                with torch.inference_mode():
+                    image_features = encode_image(batch_tensor)
+                    image_features /= image_features.norm(dim=-1, keepdim=True) # Normalize
+                return image_features.float().cpu().numpy() # (N, 768)
         except Exception as e:
             print(f"Error in extract_clip_features_batch: {e}")
             return np.zeros((len(images), 768), dtype=np.float32)
 
-    def extract_face_features_batch(self, images_np: List[np.ndarray]) -> List[List[dict]]:
+    def _stage_batch(self, tensors: List[torch.Tensor]) -> torch.Tensor:
+        """Copy preprocessed (3, 224, 224) tensors into the pinned fp16 host buffer; returns the filled view."""
+        n = len(tensors)
+        if self._batch_pinned is None or self._batch_pinned.shape[0] < n:
+            capacity = max(32, 1 << (n - 1).bit_length())
+            self._batch_pinned = torch.empty((capacity, *tensors[0].shape), dtype=self.clip_dtype, pin_memory=True)
+        staged = self._batch_pinned[:n]
+        for i, t in enumerate(tensors):
+            staged[i].copy_(t)  # casts to fp16 in place, no intermediate stack
+        return staged
+
+    def extract_face_features_batch(self, images_np: List[np.ndarray]) -> List[FaceBatch]:
         """
-        InsightFace doesn't natively support batch inference in the same way (detection size varies).
-        We simulate batching by processing sequentially but minimizing overhead.
+        Detection stays per image (input sizes vary), but the aligned 112x112 crops of
+        every face in the batch go through ArcFace in as few ONNX runs as possible
+        (slices of FACE_REC_MAX_BATCH). A failed slice drops only its own faces.
         
         Input: List of BGR numpy arrays.
-        Returns: List of Lists of face dicts.
+        Returns: one FaceBatch per image.
         """
-        batch_results = []
+        detections = []
+        crops = []
         for img in images_np:
-            batch_results.append(self.extract_face_features(img))
-        return batch_results
+            try:
+                bboxes, kpss = self.det.detect(img, max_num=0, metric='default')
+            except Exception as e:
+                print(f"Error in extract_face_features (detection): {e}")
+                bboxes, kpss = None, None
+            if kpss is None or len(bboxes) == 0:
+                detections.append(None)
+                continue
+            detections.append((bboxes, kpss))
+            crops.extend(face_align.norm_crop(img, landmark=kps, image_size=self.rec.input_size[0]) for kps in kpss)
+
+        if not crops:
+            return [FaceBatch.empty() for _ in images_np]
+
+        # get_feat applies the model's mean/std and BGR->RGB, then one session.run per slice
+        embeddings = np.empty((len(crops), 512), dtype=np.float32)  # (T, 512)
+        ok = np.ones(len(crops), dtype=bool)
+        for i in range(0, len(crops), FACE_REC_MAX_BATCH):
+            try:
+                embeddings[i:i + FACE_REC_MAX_BATCH] = self.rec.get_feat(crops[i:i + FACE_REC_MAX_BATCH])
+            except Exception as e:
+                print(f"Error in extract_face_features (recognition): {e}")
+                ok[i:i + FACE_REC_MAX_BATCH] = False
+
+        # Scatter rows back to their images, skipping faces from failed slices
+        results = []
+        start = 0
+        for det in detections:
+            if det is None:
+                results.append(FaceBatch.empty())
+                continue
+            bboxes, kpss = det
+            end = start + len(bboxes)
+            keep = ok[start:end]
+            results.append(FaceBatch(
+                bboxes=bboxes[keep, :4].astype(np.int32),
+                kps=kpss[keep].astype(np.int32), # Landmarks
+                scores=bboxes[keep, 4].astype(np.float32),
+                embeddings=embeddings[start:end][keep],
+            ))
+            start = end
+        return results
+
+    def _whisper_worker(self) -> subprocess.Popen:
+        """The running Whisper worker process, (re)started if needed. Caller holds _whisper_lock."""
+        if self._whisper_proc is None or self._whisper_proc.poll() is not None:
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            # Suppress console window on windows
+            creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            self._whisper_proc = subprocess.Popen(
+                [sys.executable, "-m", "src.core.whisper_worker"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                cwd=project_root, text=True, encoding='utf-8', bufsize=1,
+                creationflags=creationflags,
+            )
+        return self._whisper_proc
 
     def transcribe_audio(self, audio_path: str) -> List[Dict[str, Any]]:
         """
         Transcribe audio file using Whisper.
-        Isolated to a subprocess to prevent ctranslate2/onnxruntime DLL conflicts.
+        Isolated to a persistent worker process to prevent ctranslate2/onnxruntime DLL conflicts.
         Returns: [{'start': float, 'end': float, 'text': str}, ...]
         """
         if not HAS_WHISPER:
@@ -219,61 +581,34 @@ class AIEngine:
             print(f"Audio file not found for transcription: {audio_path}")
             return []
 
-        try:
-            import tempfile, subprocess, json, sys
-            
-            # Create a tiny Python script to run Whisper isolated from the main process
-            script_code = '''
-import sys, json
-try:
-    from faster_whisper import WhisperModel
-    model = WhisperModel('base', device='cpu', compute_type='int8')
-    segs, info = model.transcribe(sys.argv[1], beam_size=5)
-    out = [{'start': s.start, 'end': s.end, 'text': s.text.strip()} for s in segs]
-    print(json.dumps(out))
-except Exception as e:
-    import traceback
-    traceback.print_exc(file=sys.stderr)
-    print(json.dumps({'error': str(e)}))
-'''
-            # Windows requires the absolute audio path and correct escaping
-            abs_audio_path = os.path.abspath(audio_path).replace('\\', '/')
-            
-            with tempfile.NamedTemporaryFile(suffix='.py', delete=False, mode='w', encoding='utf-8') as f:
-                f.write(script_code)
-                script_path = f.name
-                
-            cmd = [sys.executable, script_path, abs_audio_path]
-            # Suppress console window on windows
-            creationflags = 0
-            if os.name == 'nt':
-                creationflags = subprocess.CREATE_NO_WINDOW
-                
-            res = subprocess.run(cmd, capture_output=True, text=True, creationflags=creationflags)
-            
-            if os.path.exists(script_path):
-                os.remove(script_path)
-                
-            if res.returncode != 0:
-                print(f"Whisper subprocess failed: {res.stderr}")
-                return []
-                
+        with self._whisper_lock:
             try:
-                # Find the JSON array line as ctranslate2 might print warnings
-                lines = res.stdout.strip().splitlines()
-                json_str = lines[-1] if lines else "[]"
-                
-                # Check if it returned an error dictionary
-                result_data = json.loads(json_str)
-                if isinstance(result_data, dict) and 'error' in result_data:
-                    print(f"Whisper Error: {result_data['error']}")
-                    return []
-                    
-                return result_data
+                proc = self._whisper_worker()
+                proc.stdin.write(json.dumps({'path': os.path.abspath(audio_path)}) + '\n')
+                proc.stdin.flush()
+                line = proc.stdout.readline()
             except Exception as e:
-                print(f"Failed to parse Whisper output: {e}\nSTDOUT: {res.stdout}")
+                print(f"Error executing transcribe_audio: {e}")
+                self._stop_whisper_worker()
                 return []
-                
-        except Exception as e:
-            print(f"Error executing transcribe_audio: {e}")
+
+            if not line:
+                print("Whisper worker exited unexpectedly; it will be restarted on the next call.")
+                self._stop_whisper_worker()
+                return []
+
+        try:
+            result_data = json.loads(line)
+        except ValueError as e:
+            print(f"Failed to parse Whisper output: {e}\nSTDOUT: {line}")
+            return []
+        # Check if it returned an error dictionary
+        if isinstance(result_data, dict) and 'error' in result_data:
+            print(f"Whisper Error: {result_data['error']}")
             return []
+        return result_data
+
+    def _stop_whisper_worker(self):
+        proc, self._whisper_proc = self._whisper_proc, None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
@@ -3,35 +3,93 @@ import os
 import numpy as np
 import pickle
 import faiss
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from PIL import Image
 from .ai_models import AIEngine
 from ..data.schemas import MediaItem
 
+def _quantize_rows(mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: mat ~= q * scales[:, None]."""
+    scales = np.maximum(np.abs(mat).max(axis=1), 1e-12).astype(np.float32) / 127.0
+    q = np.round(mat / scales[:, None]).astype(np.int8)
+    return q, scales
+
 class CustomClassifier:
     """
     Few-shot learner using Nearest Class Mean (Centroid) classifier on CLIP embeddings.
     """
+    TRAIN_BATCH = 64 # Images per CLIP forward during training
+    
     def __init__(self, ai_engine: AIEngine, model_path: str = "data/classifier_model.pkl"):
         self.ai_engine = ai_engine
         self.model_path = model_path
-        self.centroids: Dict[str, np.ndarray] = {} # {'category_name': centroid_vector}
+        # Centroids stacked row-wise (K, D) as int8 with per-row scales; this is the only
+        # copy kept, and classification is one integer matmul over it
+        self._cat_names: List[str] = []
+        self._cat_matrix: Optional[np.ndarray] = None
+        self._cat_scales: Optional[np.ndarray] = None
         self.load_model()
         
+    def _merge_centroids(self, centroids: Dict[str, np.ndarray]):
+        """
+        Quantize new or retrained centroids into the matrix. Rows for other categories
+        are left as stored, so they are never requantized.
+        """
+        if not centroids:
+            return
+        names = list(centroids.keys())
+        mat = np.stack([centroids[c] for c in names]).astype(np.float32)
+        q, scales = _quantize_rows(mat / np.linalg.norm(mat, axis=1, keepdims=True))
+        if self._cat_matrix is None:
+            self._cat_names, self._cat_matrix, self._cat_scales = names, q, scales
+            return
+        index = {c: i for i, c in enumerate(self._cat_names)}
+        new_rows = [i for i, c in enumerate(names) if c not in index]
+        for i, c in enumerate(names):
+            if c in index:
+                self._cat_matrix[index[c]] = q[i]
+                self._cat_scales[index[c]] = scales[i]
+        if new_rows:
+            self._cat_names += [names[i] for i in new_rows]
+            self._cat_matrix = np.concatenate([self._cat_matrix, q[new_rows]])
+            self._cat_scales = np.concatenate([self._cat_scales, scales[new_rows]])
+        
+    @property
+    def npz_path(self) -> str:
+        return os.path.splitext(self.model_path)[0] + ".npz"
+        
     def load_model(self):
-        if os.path.exists(self.model_path):
+        self._cat_names, self._cat_matrix, self._cat_scales = [], None, None
+        if os.path.exists(self.npz_path):
+            try:
+                # One contiguous (K, D) read; names are a plain unicode array (no pickle)
+                with np.load(self.npz_path) as f:
+                    names = f['names'].tolist()
+                    if 'scales' in f: # int8 rows, used as stored
+                        self._cat_names, self._cat_matrix, self._cat_scales = names, f['matrix'], f['scales']
+                    else: # float32 rows from before quantization
+                        self._merge_centroids(dict(zip(names, f['matrix'])))
+                print(f"Loaded classifier with {len(self._cat_names)} categories.")
+            except Exception as e:
+                print(f"Failed to load classifier: {e}")
+                self._cat_names, self._cat_matrix, self._cat_scales = [], None, None
+        elif os.path.exists(self.model_path):
+            # Legacy pickle: load once and rewrite as .npz
             try:
                 with open(self.model_path, 'rb') as f:
-                    self.centroids = pickle.load(f)
-                print(f"Loaded classifier with {len(self.centroids)} categories.")
+                    self._merge_centroids(pickle.load(f))
+                print(f"Loaded classifier with {len(self._cat_names)} categories.")
+                self.save_model()
             except Exception as e:
                 print(f"Failed to load classifier: {e}")
-                self.centroids = {}
+                self._cat_names, self._cat_matrix, self._cat_scales = [], None, None
 
     def save_model(self):
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(self.centroids, f)
+        os.makedirs(os.path.dirname(self.npz_path) or ".", exist_ok=True)
+        if self._cat_matrix is None:
+            return
+        np.savez(self.npz_path, matrix=self._cat_matrix, scales=self._cat_scales, names=np.array(self._cat_names))
             
     def train(self, training_dir: str):
         """
@@ -47,38 +105,48 @@ class CustomClassifier:
 
         cam_subdirs = [d for d in os.listdir(training_dir) if os.path.isdir(os.path.join(training_dir, d))]
         
-        for cat in cam_subdirs:
-            cat_dir = os.path.join(training_dir, cat)
-            vectors = []
-            
-            # Scan images
-            files = [f for f in os.listdir(cat_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
-            
-            if not files:
-                continue
+        def load(path):
+            try:
+                with Image.open(path) as img:
+                    # JPEG shrink-on-load: DCT-domain downscale, still >= CLIP's 224 input
+                    img.draft('RGB', (224, 224))
+                    return img.convert('RGB')
+            except Exception as e:
+                print(f"Error loading {os.path.basename(path)}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=8) as loader:
+            for cat in cam_subdirs:
+                cat_dir = os.path.join(training_dir, cat)
                 
-            print(f"Processing category '{cat}' ({len(files)} images)...")
-            
-            for f in files:
-                path = os.path.join(cat_dir, f)
-                try:
-                    img = Image.open(path).convert('RGB')
-                    vec = self.ai_engine.extract_clip_feature(img)
-                    vectors.append(vec)
-                except Exception as e:
-                    print(f"Error loading {f}: {e}")
-            
-            if vectors:
-                # Compute Centroid
-                # Stack: (N, 768)
-                mat = np.stack(vectors)
-                # Mean
-                centroid = np.mean(mat, axis=0) # (768,)
-                # Normalize Centroid (Cosine similarity requires normalized vectors)
-                centroid /= np.linalg.norm(centroid)
-                new_centroids[cat] = centroid.astype(np.float32)
+                # Scan images
+                files = [f for f in os.listdir(cat_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+                
+                if not files:
+                    continue
+                    
+                print(f"Processing category '{cat}' ({len(files)} images)...")
+                
+                # Running sum over batched CLIP forwards; the (N, 768) matrix is never built
+                running_sum = np.zeros(768, dtype=np.float64)
+                count = 0
+                for start in range(0, len(files), self.TRAIN_BATCH):
+                    chunk = [os.path.join(cat_dir, f) for f in files[start:start + self.TRAIN_BATCH]]
+                    imgs = [img for img in loader.map(load, chunk) if img is not None]
+                    if not imgs:
+                        continue
+                    vecs = self.ai_engine.extract_clip_features_batch(imgs)
+                    running_sum += vecs.sum(axis=0)
+                    count += len(vecs)
+                
+                if count:
+                    # Compute Centroid
+                    centroid = running_sum / count
+                    # Normalize Centroid (Cosine similarity requires normalized vectors)
+                    centroid /= np.linalg.norm(centroid)
+                    new_centroids[cat] = centroid.astype(np.float32)
                 
-        self.centroids.update(new_centroids)
+        self._merge_centroids(new_centroids)
         self.save_model()
         print("Training complete.")
         
@@ -86,24 +154,34 @@ class CustomClassifier:
         """
         Classify a single vector. Returns category name or None if below threshold.
         """
-        if not self.centroids:
+        if self._cat_matrix is None:
             return None
             
-        best_cat = None
-        best_sim = -1.0
-        
         # Ensure input is normalized
-        vec = clip_vector / np.linalg.norm(clip_vector)
+        vec = (clip_vector / np.linalg.norm(clip_vector)).astype(np.float32)
+        vq, v_scale = _quantize_rows(vec[None])
         
-        for cat, centroid in self.centroids.items():
-            sim = np.dot(vec, centroid)
-            if sim > best_sim:
-                best_sim = sim
-                best_cat = cat
-                
-        if best_sim >= threshold:
-            return best_cat
+        sims = (self._cat_matrix.astype(np.int32) @ vq[0].astype(np.int32)) * self._cat_scales * v_scale[0]
+        k = int(sims.argmax())
+        if sims[k] >= threshold:
+            return self._cat_names[k]
         return None
 
+    def classify_batch(self, clip_vectors: np.ndarray, threshold: float = 0.25) -> List[Optional[str]]:
+        """
+        Classify (N, D) vectors with one (N, D) @ (D, K) matmul.
+        """
+        if self._cat_matrix is None:
+            return [None] * len(clip_vectors)
+            
+        vecs = np.asarray(clip_vectors, dtype=np.float32)
+        vecs = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+        vq, v_scales = _quantize_rows(vecs)
+        
+        sims = (vq.astype(np.int32) @ self._cat_matrix.T.astype(np.int32)) * v_scales[:, None] * self._cat_scales
+        best = sims.argmax(axis=1)
+        best_sims = sims[np.arange(len(best)), best]
+        return [self._cat_names[k] if sim >= threshold else None for k, sim in zip(best.tolist(), best_sims.tolist())]
+
     def get_categories(self) -> List[str]:
-        return list(self.centroids.keys())
+        return list(self._cat_names)
@@ -1,12 +1,24 @@
 
 import numpy as np
-import sqlite3
 import os
+import re
+from functools import lru_cache
 import faiss
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import List, Tuple, Dict, Optional
 from ..data.db_manager import DBManager
 from ..data.schemas import MediaItem
+from ..config import Config
+from .hashing import compute_dhash, hamming_distances
+
+# Numeric/sequential filename suffix (like _p0, _p1, (2) or 1, 2)
+_SEQ_RE = re.compile(r'^[_ \-p\(r]*[0-9]+[\)]*$', re.IGNORECASE)
+
+@lru_cache(maxsize=65536)
+def _stem(path: str) -> str:
+    # A file shows up in many candidate pairs; split its name once
+    return os.path.splitext(os.path.basename(path))[0]
 
 @dataclass
 class DuplicatePair:
@@ -47,16 +59,12 @@ class Deduplicator:
         
         try:
             print("Fetching vectors/IDs from FAISS...")
-             # Reconstruct vectors (or use iterator if too large)
-             # Reconstruct vectors (or use iterator if too large)
             # Use offset based reconstruction safe for IDMap
             sub_index = index.index if hasattr(index, 'index') else index
-            
-            vectors = []
-            for i in range(ntotal):
-                 vec = sub_index.reconstruct(i)
-                 vectors.append(vec)
-            vectors = np.array(vectors)
+            if hasattr(sub_index, 'make_direct_map'):
+                sub_index.make_direct_map()  # IVF indices can't reconstruct without it
+            # One C++ call into a contiguous (N, D) float32 array
+            vectors = sub_index.reconstruct_n(0, ntotal)
                  
             print(f"Vectors shape: {vectors.shape}")
             # IDs
@@ -72,115 +80,92 @@ class Deduplicator:
             # Using simple dot product for python control (N < 5000 is fast enough).
             # If N > 10000, use FAISS. Let's use FAISS.
             
-            res_lims, res_D, res_I = index.range_search(vectors, threshold_img)
+            if self.db_manager.clip_ann is not None:
+                # Large library: range search over inverted lists instead of the O(N^2) flat scan
+                q_ids, res_I, res_D = self._ivf_range_search(vectors, ids, threshold_img)
+            else:
+                res_lims, res_D, res_I = index.range_search(vectors, threshold_img)
+                # Flatten range_search results into (query, target, sim) arrays; IndexIDMap
+                # already returns file ids as labels.
+                q_ids = np.repeat(ids, np.diff(res_lims).astype(np.int64))
             
-            # Resolve to pairs
-            # res_lims is standard start-end ptrs
+            # q < t keeps one of A-B / B-A and drops self.
+            mask = (q_ids < res_I) & (res_D <= 0.9999) # > 0.9999: probably exact same file
+            q_ids, t_ids, sims = q_ids[mask], res_I[mask], res_D[mask]
             
             # Fetch Metadata Cache
-            conn = sqlite3.connect(self.db_manager.sqlite_path)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
+            # Plain tuples in a fixed column order (no sqlite3.Row per-field lookups), and
+            # MediaItems only for files that actually appear in a candidate pair
+            needed = set(np.concatenate([q_ids, t_ids]).tolist())
+            cur = self.db_manager.get_conn().cursor()
+            cur.row_factory = None
+            rows = cur.execute("""
+                SELECT id, file_path, file_hash, file_size, media_type, created_at, modified_at,
+                       width, height, duration, error_msg, dhash
+                FROM files WHERE is_processed=1
+            """).fetchall()
+            file_map = {
+                r[0]: MediaItem(*r[1:10], error_msg=r[10], dhash=r[11])
+                for r in rows if r[0] in needed
+            }
             
-            # Need to map ID -> MediaItem
-            # Query all files
-            c.execute("SELECT * FROM files WHERE is_processed=1")
-            file_map = {}
-            for row in c.fetchall():
-                 item = MediaItem(
-                     file_path=row['file_path'],
-                     file_hash=row['file_hash'],
-                     file_size=row['file_size'],
-                     media_type=row['media_type'],
-                     created_at=row['created_at'],
-                     modified_at=row['modified_at'],
-                     width=row['width'],
-                     height=row['height'],
-                     duration=row['duration'],
-                     error_msg=row['error_msg']
-                 )
-                 file_map[row['id']] = item
-            conn.close()
+            candidates = zip(q_ids.tolist(), t_ids.tolist(), sims.tolist())
             
-            checked = set()
-            
-            for i in range(ntotal):
-                query_id = ids[i]
-                start = res_lims[i]
-                end = res_lims[i+1]
+            survivors = []
+            for query_id, target_id, sim in candidates:
+                item_a = file_map.get(query_id)
+                item_b = file_map.get(target_id)
                 
-                for j in range(start, end):
-                    target_id = res_I[j]
-                    sim = res_D[j]
-                    
-                    if query_id >= target_id: continue # Avoid self and duplicates (A-B, B-A)
-                    if sim > 0.9999: continue # Probably exact same file (or self if diagonal not skipped)
-                    
-                    pair_key = tuple(sorted((query_id, target_id)))
-                    if pair_key in checked: continue
-                    checked.add(pair_key)
-                    
-                    item_a = file_map.get(int(query_id))
-                    item_b = file_map.get(int(target_id))
-                    
-                    if not item_a or not item_b: continue
-                    
-                    if self._is_sequential(item_a.file_path, item_b.file_path):
-                        continue
+                if not item_a or not item_b: continue
+                
+                if self._is_sequential(item_a.file_path, item_b.file_path):
+                    continue
 
-                    # Video specific check
-                    if item_a.media_type == 'video' and item_b.media_type == 'video':
-                        # Check duration similarity
-                        dur_a = item_a.duration or 0
-                        dur_b = item_b.duration or 0
-                        
-                        if abs(dur_a - dur_b) > 2.0: # Tolerance 2s
-                             continue
-                        
-                        if sim < threshold_vid:
-                             continue
-                             
-                    elif item_a.media_type != item_b.media_type:
-                        # Skip cross-media
-                        continue
-                        
-                    # --- NEW: dHash Check for Images ---
-                    # CLIP is semantic, dHash is structural.
-                    # If CLIP says duplicate but dHash diff is large -> False Positive (e.g. same character but different pose)
-                    if item_a.media_type == 'image' and item_b.media_type == 'image':
-                        # Only check if sim is borderline? No, check always to be safe.
-                        from .hashing import compute_dhash, hamming_distance
-                        
-                        # We calculate on fly? Yes (disk I/O cost but cleaner is offline task)
-                        # Ideally should cache hash in DB during scan.. but for now:
-                        try:
-                            # Use cache if we had it, but we don't.
-                            # Just computing for candidates.
-                            hash_a = compute_dhash(item_a.file_path)
-                            hash_b = compute_dhash(item_b.file_path)
-                            
-                            dist = hamming_distance(hash_a, hash_b)
-                            
-                            # If dist > 10 (out of 64), likely different structure
-                            # Let's use strict threshold 8 for "Duplicate"
-                            if dist > 8:
-                                continue # Skip, structural diff too large
-                                
-                        except Exception as e:
-                            print(f"Hash calc failed: {e}")
-                            pass
-                        
-                    # Determine Action
-                    action, reason = self._recommend_action(item_a, item_b)
+                # Video specific check
+                if item_a.media_type == 'video' and item_b.media_type == 'video':
+                    # Check duration similarity
+                    dur_a = item_a.duration or 0
+                    dur_b = item_b.duration or 0
                     
-                    pairs.append(DuplicatePair(
-                        file_a=item_a,
-                        file_b=item_b,
-                        similarity=float(sim),
-                        recommended_action=action,
-                        reason=reason
-                    ))
+                    if abs(dur_a - dur_b) > 2.0: # Tolerance 2s
+                         continue
                     
+                    if sim < threshold_vid:
+                         continue
+                         
+                elif item_a.media_type != item_b.media_type:
+                    # Skip cross-media
+                    continue
+                
+                survivors.append((item_a, item_b, sim))
+            
+            # --- dHash Check for Images ---
+            # CLIP is semantic, dHash is structural.
+            # If CLIP says duplicate but dHash diff is large -> False Positive (e.g. same character but different pose)
+            # Hashes stored at scan time are used as-is; only rows from before the
+            # dhash column are decoded here, once each even if in many pairs.
+            images = {item.file_path: item for pair in survivors for item in pair[:2] if item.media_type == 'image'}
+            hashes = {path: int(item.dhash) for path, item in images.items() if item.dhash is not None}
+            hashes.update(self._dhashes(path for path in images if path not in hashes))
+            dists = self._pair_distances(survivors, hashes)
+                
+            for (item_a, item_b, sim), dist in zip(survivors, dists):
+                # If dist > 10 (out of 64), likely different structure
+                # Let's use strict threshold 8 for "Duplicate"
+                if dist > 8:
+                    continue # Skip, structural diff too large
+                    
+                # Determine Action
+                action, reason = self._recommend_action(item_a, item_b)
+                
+                pairs.append(DuplicatePair(
+                    file_a=item_a,
+                    file_b=item_b,
+                    similarity=float(sim),
+                    recommended_action=action,
+                    reason=reason
+                ))
+                
         except Exception as e:
             print(f"Deduplication Error: {e}")
             import traceback
@@ -190,6 +175,56 @@ class Deduplicator:
         print(f"Found {len(pairs)} duplicate pairs.")
         return pairs
 
+    def _ivf_range_search(self, vectors: np.ndarray, ids: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        range_search on a throwaway IVFFlat that borrows the ANN index's trained coarse
+        quantizer: only CLIP_ANN_NPROBE of its lists are scanned per query, but scores
+        are exact (no PQ), so the threshold means the same as on the flat index.
+        Pairs come back as (min id, max id), deduplicated: A may probe B's list and not vice versa.
+        """
+        quantizer = faiss.extract_index_ivf(self.db_manager.clip_ann).quantizer
+        ivf = faiss.IndexIVFFlat(quantizer, vectors.shape[1], quantizer.ntotal, faiss.METRIC_INNER_PRODUCT)
+        ivf.add_with_ids(vectors, ids)
+        ivf.nprobe = Config.CLIP_ANN_NPROBE
+        lims, D, I = ivf.range_search(vectors, threshold)
+        
+        q = np.repeat(ids, np.diff(lims).astype(np.int64))
+        pairs = np.stack([np.minimum(q, I), np.maximum(q, I)], axis=1)
+        pairs, first = np.unique(pairs, axis=0, return_index=True)
+        return pairs[:, 0], pairs[:, 1], D[first]
+
+    @staticmethod
+    def _dhashes(paths) -> Dict[str, int]:
+        """dHash of each path, decoded in parallel (PIL releases the GIL while decoding)."""
+        paths = list(paths)
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+            hashes = dict(zip(paths, executor.map(compute_dhash, paths)))
+        return {path: h for path, h in hashes.items() if h is not None}
+
+    @staticmethod
+    def _pair_distances(pairs, hashes: Dict[str, int]) -> np.ndarray:
+        """
+        dHash hamming distance per pair, in one vectorized pass.
+        0 for non-image pairs (no structural check); 999 when a hash is missing.
+        """
+        dists = np.zeros(len(pairs), dtype=np.int64)
+        ha, hb, rows = [], [], []
+        for i, (item_a, item_b, _) in enumerate(pairs):
+            if item_a.media_type != 'image' or item_b.media_type != 'image':
+                continue
+            a, b = hashes.get(item_a.file_path), hashes.get(item_b.file_path)
+            if a is None or b is None:
+                dists[i] = 999
+                continue
+            ha.append(a)
+            hb.append(b)
+            rows.append(i)
+        if rows:
+            dists[rows] = hamming_distances(np.array(ha, dtype=np.int64), np.array(hb, dtype=np.int64))
+        return dists
+
     def _recommend_action(self, a: MediaItem, b: MediaItem) -> Tuple[str, str]:
         """
         Decide which file to keep.
@@ -223,20 +258,14 @@ class Deduplicator:
         """
         Check if two filenames are sequential (e.g. img_01.jpg and img_02.jpg).
         """
-        name_a = os.path.splitext(os.path.basename(path_a))[0]
-        name_b = os.path.splitext(os.path.basename(path_b))[0]
+        name_a = _stem(path_a)
+        name_b = _stem(path_b)
         
         if len(name_a) < 3 or len(name_b) < 3:
             return False
             
         # Find common prefix
-        min_len = min(len(name_a), len(name_b))
-        prefix_len = 0
-        for i in range(min_len):
-            if name_a[i] == name_b[i]:
-                prefix_len += 1
-            else:
-                break
+        prefix_len = len(os.path.commonprefix((name_a, name_b)))
         
         if prefix_len < 3:
             return False
@@ -246,11 +275,7 @@ class Deduplicator:
         rem_b = name_b[prefix_len:]
         
         # If both remainders are just numeric/short suffixes (like _p0, _p1 or 1, 2)
-        import re
-        # Pattern for numeric/sequential suffix
-        pattern = re.compile(r'^[_ \-p\(r]*[0-9]+[\)]*$', re.IGNORECASE)
-        
-        if (not rem_a or pattern.match(rem_a)) and (not rem_b or pattern.match(rem_b)):
+        if (not rem_a or _SEQ_RE.match(rem_a)) and (not rem_b or _SEQ_RE.match(rem_b)):
             return True
             
         return False
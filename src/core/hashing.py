@@ -1,47 +1,52 @@
+import cv2
 from PIL import Image
 import numpy as np
+from typing import Optional
 
-def compute_dhash(image_path: str, hash_size: int = 8) -> str:
+_MASK64 = (1 << 64) - 1
+
+def compute_dhash(image_path: str, hash_size: int = 8) -> Optional[int]:
     """
     Compute difference hash (dHash) for an image.
     Robust to resizing and slight color shifts.
     """
     try:
         with Image.open(image_path) as img:
-            # 1. Grayscale
-            img = img.convert("L")
-            # 2. Resize to (width=hash_size+1, height=hash_size)
-            # using LANCZOS for quality downsampling, though bilinear is fine for hash
-            img = img.resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
-            
-            pixels = np.array(img.getdata(), dtype=np.int8).reshape((hash_size, hash_size + 1))
-            
-            # 3. Compare adjacent pixels
-            # if P[x] > P[x+1] -> 1 else 0
-            diff = pixels[:, 1:] > pixels[:, :-1]
-            
-            # 4. Create hash
-            return _binary_array_to_hex(diff.flatten())
-            
+            return compute_dhash_from_pil(img, hash_size)
     except Exception as e:
         print(f"Error hashing {image_path}: {e}")
-        return ""
-
-def _binary_array_to_hex(arr: np.ndarray) -> str:
-    bit_string = "".join(["1" if b else "0" for b in arr])
-    return hex(int(bit_string, 2))[2:].rjust(len(arr)//4, '0')
+        return None
 
-def hamming_distance(hash1: str, hash2: str) -> int:
-    """Calculate hamming distance between two hex strings."""
-    if not hash1 or not hash2:
-        return 999
-        
-    # Convert to int
-    h1 = int(hash1, 16)
-    h2 = int(hash2, 16)
+def compute_dhash_from_pil(img: Image.Image, hash_size: int = 8) -> int:
+    """dHash of an already-decoded image (callers that loaded it for CLIP skip the re-read)."""
+    # 1. Grayscale, as a uint8 view of the pixel buffer (no per-pixel getdata())
+    gray = np.asarray(img.convert("L"), dtype=np.uint8)
+    # 2. Resize to (width=hash_size+1, height=hash_size)
+    # INTER_AREA is the right filter for heavy downscaling and much faster than LANCZOS
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
     
-    # XOR
-    x = h1 ^ h2
+    # 3. Compare adjacent pixels
+    # if P[x] > P[x+1] -> 1 else 0 (uint8: no wraparound for pixels > 127)
+    diff = small[:, 1:] > small[:, :-1]
     
-    # Count bits
-    return bin(x).count('1')
+    # 4. Create hash
+    return _binary_array_to_int(diff.flatten())
+
+def _binary_array_to_int(arr: np.ndarray) -> int:
+    # Pack the bits MSB-first and read them back as one integer. 64-bit hashes are
+    # folded into SQLite's signed INTEGER range (same bits, two's complement).
+    h = int.from_bytes(np.packbits(arr, bitorder='big').tobytes(), 'big')
+    if len(arr) == 64 and h >= 1 << 63:
+        h -= 1 << 64
+    return h
+
+def hamming_distance(hash1: Optional[int], hash2: Optional[int]) -> int:
+    """Calculate hamming distance between two 64-bit dHashes."""
+    if hash1 is None or hash2 is None:
+        return 999
+    return ((hash1 ^ hash2) & _MASK64).bit_count()
+
+def hamming_distances(hashes1: np.ndarray, hashes2: np.ndarray) -> np.ndarray:
+    """Element-wise hamming distances between two equal-length arrays of 64-bit dHashes."""
+    x = np.bitwise_xor(np.asarray(hashes1, dtype=np.int64), np.asarray(hashes2, dtype=np.int64))
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
@@ -1,7 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
+import cv2
 import numpy as np
 from PIL import Image
-import torch
 
 from .ai_models import AIEngine
 from .character_tagger import CharacterTagger
@@ -15,6 +16,15 @@ class InferenceOrchestrator:
     def __init__(self, ai_engine: AIEngine = None):
         self.ai_engine = ai_engine if ai_engine else AIEngine()
         self.char_tagger = CharacterTagger()
+        # Face detection runs here while CLIP (and the tagger) run on the caller's thread;
+        # torch, InsightFace and ORT all release the GIL inside their kernels
+        self._face_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="face")
+        
+    @staticmethod
+    def _to_bgr(img: Image.Image) -> np.ndarray:
+        """Contiguous BGR uint8 copy for InsightFace: one SIMD pass, no convert() copy when already RGB."""
+        rgb = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
         
     def classify_style(self, img: Image.Image) -> str:
         return self.ai_engine.classify_style(img)
@@ -26,36 +36,33 @@ class InferenceOrchestrator:
         """
         result = {}
         
-        # 1. Style Detection
-        style = self.classify_style(img)
-        result['style'] = style
+        # 1. Face Detection, overlapped with everything below
+        # Needs BGR numpy
+        faces_future = self._face_pool.submit(self.ai_engine.extract_face_features, self._to_bgr(img))
         
         # 2. CLIP Embedding
-        clip_vec = self.ai_engine.extract_clip_feature(img).tolist()
+        clip_vec = self.ai_engine.extract_clip_feature(img)
         result['clip'] = clip_vec
         
-        # 3. Face Detection
-        # Needs BGR numpy
-        img_np = np.array(img.convert('RGB'))
-        img_bgr = img_np[:, :, ::-1]
-        raw_faces = self.ai_engine.extract_face_features(img_bgr)
-        # Convert to serializable format (list of dicts) if not already
-        # extract_face_features returns list of dicts.
-        # We might want to standardise schemas here or in Processor?
-        # Let's return raw for now, caller maps to Schema.
-        result['faces'] = raw_faces
+        # 3. Style Detection from the embedding above (no second CLIP forward),
+        # then Character Tagging for illustrations
+        result['style'], result['char_tags'], result['series_tags'] = self.tag_with_style(img, clip_vec)
         
-        # 4. Character Tagging (Conditional)
-        if style == "illustration":
-            c_tags, s_tags = self.char_tagger.tag_image(img)
-            result['char_tags'] = c_tags
-            result['series_tags'] = s_tags
-        else:
-            result['char_tags'] = []
-            result['series_tags'] = []
+        # FaceBatch of parallel arrays; caller maps to Schema (MetadataManager.create_face_data)
+        result['faces'] = faces_future.result()
             
         return result
 
+    def tag_with_style(self, img: Image.Image, clip_vec: np.ndarray) -> Tuple[str, List[str], List[str]]:
+        """
+        Style from an already computed CLIP embedding, plus character/series tags
+        for illustrations (photos get none). Returns (style, char_tags, series_tags).
+        """
+        if float(clip_vec @ self.ai_engine.decision_dir_np) > 0:
+            return "photo", [], []
+        c_tags, s_tags = self.char_tagger.tag_image(img)
+        return "illustration", c_tags, s_tags
+
     def process_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
         """
         Process a batch of images.
@@ -72,28 +79,18 @@ class InferenceOrchestrator:
         clip_vecs = self.ai_engine.extract_clip_features_batch(images)
         
         # 2. Face Batch
-        bgr_stack = [np.array(img.convert('RGB'))[:, :, ::-1] for img in images]
+        bgr_stack = [self._to_bgr(img) for img in images]
         faces_list = self.ai_engine.extract_face_features_batch(bgr_stack)
         
         # 3. Style Classification
         results = []
         
-        # Tagging Batch Prep
-        ill_indices = []
-        style_list = []
-        
         # Determine Style & Collect Illustration Indices
-        for i, vec in enumerate(clip_vecs):
-            # dot product with style means
-            vec_tensor = torch.tensor(vec).to(self.ai_engine.device).unsqueeze(0).to(self.ai_engine.style_mean.dtype)
-            score_anime = (vec_tensor @ self.ai_engine.style_mean.T).item()
-            score_photo = (vec_tensor @ self.ai_engine.photo_mean.T).item()
-            
-            style = "photo" if score_photo > score_anime else "illustration"
-            style_list.append(style)
-            
-            if style == "illustration":
-                ill_indices.append(i)
+        # One GEMV over the whole batch with the photo-vs-style direction (CPU, vectors already there);
+        # photo_mean·v - style_mean·v == (photo_mean - style_mean)·v, so this is the 2-column GEMM folded
+        is_photo = (np.asarray(clip_vecs, dtype=np.float32) @ self.ai_engine.decision_dir_np) > 0
+        style_list = np.where(is_photo, "photo", "illustration").tolist()
+        ill_indices = np.flatnonzero(~is_photo).tolist()
         
         # Run Tagger on Illustrations Only
         batch_char_tags = [([], []) for _ in range(len(images))]
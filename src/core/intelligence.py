@@ -1,9 +1,9 @@
 
 import numpy as np
-from sklearn.cluster import DBSCAN
-import sqlite3
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 import faiss
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 from .ai_models import AIEngine
 from ..data.db_manager import DBManager
@@ -20,16 +20,18 @@ class AutoTagger:
     def __init__(self, ai_engine: AIEngine, tags: List[str] = DEFAULT_TAGS):
         self.ai_engine = ai_engine
         self.tags = tags
+        self._tags_arr = np.array(tags, dtype=object) # fancy-indexable for per-row extraction
         self.tag_vectors = self._precompute_tags()
+        # Fixed (768, N) right-hand side for suggest_tags, normalized and laid out once
+        norms = np.linalg.norm(self.tag_vectors, axis=1, keepdims=True)
+        self._tag_matrix_t = np.ascontiguousarray((self.tag_vectors / np.maximum(norms, 1e-12)).T, dtype=np.float32)
         
     def _precompute_tags(self) -> np.ndarray:
         print("Precomputing Auto-Tagging vectors...")
-        vecs = []
-        for t in self.tags:
-            # Use "a photo of {tag}" for better context
-            text_emb = self.ai_engine.extract_clip_text_feature(f"a photo of {t}")
-            vecs.append(text_emb)
-        return np.array(vecs) # (N, 768)
+        # Use "a photo of {tag}" for better context
+        # Served from the persistent text embedding cache after the first run;
+        # rows are L2-normalized, so suggest_tags scores are cosine similarities
+        return self.ai_engine.encode_prompts([f"a photo of {t}" for t in self.tags]) # (N, 768)
 
     def suggest_tags(self, image_vectors: np.ndarray, top_k: int = 5, threshold: float = 0.20) -> List[List[str]]:
         """
@@ -41,22 +43,72 @@ class AutoTagger:
         if image_vectors.ndim == 1:
             image_vectors = image_vectors[np.newaxis, :]
             
-        # Calc similarity: (B, 768) @ (N, 768).T = (B, N)
-        scores = image_vectors @ self.tag_vectors.T
+        # Calc similarity: (B, 768) @ (768, N) = (B, N), float32 BLAS
+        scores = np.asarray(image_vectors, dtype=np.float32) @ self._tag_matrix_t
         
-        batch_tags = []
-        for i in range(len(image_vectors)):
-            # Get top K indices
-            inds = np.argsort(scores[i])[::-1]
-            
-            suggested = []
-            for idx in inds[:top_k]:
-                score = scores[i][idx]
-                if score >= threshold:
-                    suggested.append(self.tags[idx])
-            batch_tags.append(suggested)
-            
-        return batch_tags
+        # Top K per row without a full sort: partition, then order just the K columns
+        k = min(top_k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(scores))]
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+        keep = np.take_along_axis(top_scores, order, axis=1) >= threshold
+        
+        return [self._tags_arr[row[mask]].tolist() for row, mask in zip(idx, keep)]
+
+def _eps_neighbors(vectors: np.ndarray, eps: float, gpu_res=None, k: int = 256) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattened eps-neighbourhoods as (rows, neighbours, counts per row), self included.
+    CPU: exact range_search. GPU flat indexes have no range_search, so there it is a
+    k-NN search thresholded at eps; a point with more than k neighbours keeps its k nearest.
+    """
+    n, d = vectors.shape
+    nn_index = faiss.IndexFlatL2(d)
+    if gpu_res is not None:
+        try:
+            nn_index = faiss.index_cpu_to_gpu(gpu_res, 0, nn_index)
+        except Exception as e:
+            print(f"GPU FAISS unavailable, clustering on CPU: {e}")
+            gpu_res = None
+    nn_index.add(vectors)
+    
+    if gpu_res is None:
+        lims, _, I = nn_index.range_search(vectors, eps * eps) # L2 index: squared distances
+        counts = np.diff(lims).astype(np.int64)
+        return np.repeat(np.arange(n), counts), I, counts
+        
+    D, I = nn_index.search(vectors, min(k, n, 2048)) # 2048: GPU k limit
+    hit = (I != -1) & (D < eps * eps)
+    return np.nonzero(hit)[0], I[hit], hit.sum(axis=1)
+
+def dbscan_faiss(vectors: np.ndarray, eps: float, min_samples: int, gpu_res=None) -> np.ndarray:
+    """
+    DBSCAN (euclidean) with the eps-neighbourhoods from FAISS (see _eps_neighbors).
+    Core points are joined by connected components over core-core edges; border
+    points take the cluster of their first core neighbour; the rest are noise (-1).
+    """
+    n = len(vectors)
+    rows, I, counts = _eps_neighbors(vectors, eps, gpu_res, k=max(256, min_samples))
+    core = counts >= min_samples # counts include the point itself, like sklearn
+    
+    labels = np.full(n, -1, dtype=np.int64)
+    if not core.any():
+        return labels
+        
+    # Clusters = connected components of the core-core neighbour graph
+    cc = core[rows] & core[I]
+    graph = csr_matrix((np.ones(int(cc.sum()), dtype=np.int8), (rows[cc], I[cc])), shape=(n, n))
+    _, comp = connected_components(graph, directed=False)
+    core_ids = np.flatnonzero(core)
+    _, labels[core_ids] = np.unique(comp[core_ids], return_inverse=True)
+    
+    # Border points: any core neighbour's cluster
+    border = ~core[rows] & core[I]
+    b_rows, first = np.unique(rows[border], return_index=True)
+    labels[b_rows] = labels[I[border][first]]
+    return labels
 
 class FaceClusterer:
     def __init__(self, db_manager: DBManager):
@@ -84,14 +136,9 @@ class FaceClusterer:
 
         try:
             # Access underlying index (IndexFlat)
-            # We iterate 0..ntotal-1 (offsets)
-            sub_index = index.index
-            
-            vectors = []
-            for i in range(ntotal):
-                 vec = sub_index.reconstruct(i)
-                 vectors.append(vec)
-            vectors = np.array(vectors)
+            # One C++ call into a contiguous (N, D) float32 array, offsets 0..ntotal-1
+            sub_index = faiss.downcast_index(index.index)
+            vectors = sub_index.reconstruct_n(0, ntotal)
             
             # Retrieve IDs corresponding to these offsets
             ids = faiss.vector_to_array(index.id_map)
@@ -101,24 +148,11 @@ class FaceClusterer:
             return 0
 
         # DBSCAN
-        # n_jobs=-1 uses all cores
-        clustering = DBSCAN(eps=eps, min_samples=min_samples, metric='euclidean', n_jobs=-1)
-        labels = clustering.fit_predict(vectors)
+        # Neighbourhoods from FAISS (BLAS) instead of sklearn's brute-force pairwise pass
+        labels = dbscan_faiss(vectors, eps, min_samples, gpu_res=self.db_manager.gpu_res)
         
         # Update DB
-        conn = sqlite3.connect(self.db_manager.sqlite_path)
-        c = conn.cursor()
-        
-        updates = []
-        for id_val, label in zip(ids, labels):
-            # labels are numpy.int64, convert to int
-            cluster_id = int(label)
-            row_id = int(id_val)
-            updates.append((cluster_id, row_id))
-        
-        c.executemany('UPDATE faces SET cluster_id = ? WHERE id = ?', updates)
-        conn.commit()
-        conn.close()
+        self.db_manager.set_face_clusters(ids, labels)
         
         n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
         print(f"Clustering complete. Found {n_clusters} clusters (excluding noise).")
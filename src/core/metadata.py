@@ -1,6 +1,6 @@
 from typing import List, Dict, Any, Optional
 import json
-from ..data.schemas import MediaItem, FaceData
+from ..data.schemas import MediaItem, FaceData, FaceBatch
 
 class MetadataManager:
     """
@@ -38,15 +38,14 @@ class MetadataManager:
              item.series_tags = series_tags
              
     @staticmethod
-    def create_face_data(raw_faces: List[Dict[str, Any]]) -> List[FaceData]:
-        """Convert raw face dicts to FaceData schema."""
-        face_vecs = []
-        for f in raw_faces:
-            face_vecs.append(FaceData(
-                embedding=f['embedding'].tolist(),
-                bbox=f['bbox'],
-                det_score=f['det_score'],
-                kps=f['kps'],
-                timestamp=f.get('timestamp', 0.0)
-            ))
-        return face_vecs
+    def create_face_data(faces: FaceBatch, timestamp: float = 0.0) -> List[FaceData]:
+        """
+        Convert a FaceBatch to FaceData schemas. Embeddings stay float32 row views of the
+        batch array (no per-float Python objects); the DB layer stacks them straight into FAISS.
+        """
+        return [
+            FaceData(embedding=emb, bbox=bbox, det_score=score, kps=kps, timestamp=timestamp)
+            for emb, bbox, score, kps in zip(
+                faces.embeddings, faces.bboxes.tolist(),
+                faces.scores.tolist(), faces.kps.tolist())
+        ]
@@ -1,16 +1,65 @@
 from PIL import Image
 import os
-from typing import Optional, Tuple
+import numpy as np
+from typing import List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _tj = TurboJPEG()
+    HAS_TURBOJPEG = True
+except (ImportError, OSError, RuntimeError):  # binding present but libturbojpeg missing
+    _tj = None
+    HAS_TURBOJPEG = False
+
+JPEG_EXTS = ('.jpg', '.jpeg', '.jfif')
+
+def _jpeg_scale(w: int, h: int, min_side: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Largest libjpeg DCT downscale that keeps the short side >= min_side."""
+    if min_side:
+        for denom in (8, 4, 2):
+            if min(w, h) // denom >= min_side:
+                return (1, denom)
+    return None
+
 class ImageProcessor:
     """
     Handles robust image loading and preprocessing.
     Decouples PIL dependency from main logic.
     """
     
+    @staticmethod
+    def load_rgb_np(path: str, min_side: Optional[int] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Decode to an (H, W, 3) RGB uint8 array; returns (array, original (width, height)).
+        JPEGs go through libjpeg-turbo's SIMD decoder when PyTurboJPEG is installed;
+        anything it can't handle (other formats, CMYK JPEGs) falls back to PIL. Raises on failure.
+        With min_side, large JPEGs are downscaled inside the decoder (DCT scaling by
+        1/2, 1/4 or 1/8) as far as the short side stays >= min_side.
+        """
+        if HAS_TURBOJPEG and path.lower().endswith(JPEG_EXTS):
+            try:
+                with open(path, 'rb') as f:
+                    buf = f.read()
+                w, h, _, _ = _tj.decode_header(buf)
+                scale = _jpeg_scale(w, h, min_side)
+                kwargs = {'scaling_factor': scale} if scale else {}
+                return _tj.decode(buf, pixel_format=TJPF_RGB, **kwargs), (w, h)
+            except Exception:
+                pass
+        with Image.open(path) as img:
+            size = img.size
+            if min_side:
+                img.draft('RGB', (min_side, min_side))  # JPEG shrink-on-load; no-op otherwise
+            return np.asarray(img.convert('RGB')), size
+
+    @staticmethod
+    def decode_rgb(path: str) -> Image.Image:
+        """RGB PIL image via load_rgb_np's fast path. Raises on failure."""
+        return Image.fromarray(ImageProcessor.load_rgb_np(path)[0])
+
     @staticmethod
     def load_image(path: str, convert_mode: str = 'RGB') -> Optional[Image.Image]:
         """
@@ -18,6 +67,8 @@ class ImageProcessor:
         Returns None if loading fails.
         """
         try:
+            if convert_mode == 'RGB':
+                return ImageProcessor.decode_rgb(path)
             img = Image.open(path)
             if convert_mode:
                 img = img.convert(convert_mode)
@@ -37,3 +88,15 @@ class ImageProcessor:
                 return img.size
         except:
             return (0, 0)
+
+
+def decode_rgb_np(path: str, min_side: Optional[int] = None) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]:
+    """
+    ImageProcessor.load_rgb_np for process pools: module-level (picklable) and
+    reports failures in-band as (None, None, error) so one corrupt file doesn't fail a batch.
+    """
+    try:
+        arr, size = ImageProcessor.load_rgb_np(path, min_side)
+        return arr, size, None
+    except Exception as e:
+        return None, None, str(e)
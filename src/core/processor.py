@@ -1,8 +1,15 @@
 
 import os
+import queue
 import sys
+import threading
 import traceback
-from typing import List, Generator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Generator, Optional, Union
+import numpy as np
 from PIL import Image
 from .scanner import Scanner
 from .ai_models import AIEngine
@@ -12,11 +19,85 @@ from ..data.schemas import MediaItem, VectorData, ProcessingResult, FaceData
 from .intelligence import AutoTagger
 from .character_tagger import CharacterTagger
 from ..config import Config
-from .preprocessing import ImageProcessor
+from .preprocessing import ImageProcessor, decode_rgb_np
 from .inference import InferenceOrchestrator
 from .metadata import MetadataManager
+from .thumbnails import generate_pyramid
+from .hashing import compute_dhash_from_pil
+
+def prefetch(iterable: Iterable) -> Iterator:
+    """
+    Yield from iterable while its next item is produced on a background thread,
+    so building batch N+1 (hashing, DB checks) overlaps with inferring batch N.
+    """
+    it = iter(iterable)
+    done = object()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(next, it, done)
+        while True:
+            item = pending.result()
+            if item is done:
+                return
+            pending = executor.submit(next, it, done)
+            yield item
+
+class BackgroundIterator:
+    """
+    Drain an iterable on a daemon thread into a bounded queue, so a slow producer
+    (a directory walk over a NAS) overlaps with consuming its items.
+    `produced` is the running item count and `done` flips once the producer is exhausted.
+    """
+    _END = object()
+
+    def __init__(self, iterable: Iterable, maxsize: int = 1024):
+        self.produced = 0
+        self.done = False
+        self._error = None
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(iterable,), daemon=True, name="background-iter")
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterable: Iterable):
+        try:
+            for item in iterable:
+                self.produced += 1
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self._error = e
+        finally:
+            self.done = True
+            self._put(self._END)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def close(self):
+        """Stop the producer (it exits at its next item) when the consumer gives up early."""
+        self._stop.set()
 
 class Processor:
+    # Minimum seconds between per-file progress updates from process_folder
+    PROGRESS_INTERVAL = 0.1
+    # Files inspected and checked against the DB together by process_folder
+    INSPECT_CHUNK = 256
+
     def __init__(self, db_dir=None):
         if db_dir is None:
             db_dir = Config.DB_DIR
@@ -28,154 +109,138 @@ class Processor:
         self.video_processor = VideoProcessor()
         self.auto_tagger = AutoTagger(self.ai_engine)
         # self.char_tagger removed (Migrated to InferenceOrchestrator)
+        self._thumb_pool = None
+        self._load_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="image-load")
+        self._decode_pool = None
+        # _process_item dispatch by media_type
+        self._handlers = {'image': self._process_image_item, 'video': self._process_video_item}
+
+    def _ensure_clip_ann(self):
+        """Build the approximate CLIP index once the library is large enough."""
+        if self.db_manager.clip_ann is None:
+            try:
+                self.db_manager.build_clip_ann()
+            except Exception as e:
+                print(f"CLIP ANN build failed, search stays exact: {e}")
+
+    def _queue_thumbnails(self, results: List[ProcessingResult], path_to_id: Dict[str, int]):
+        """Pre-generate the thumbnail pyramid for stored files in worker processes."""
+        if self._thumb_pool is None:
+            self._thumb_pool = ProcessPoolExecutor(max_workers=Config.THUMBNAIL_WORKERS)
+        cache_dir = os.path.join(os.path.dirname(self.db_manager.sqlite_path), ".thumbnails")
+        for r in results:
+            file_id = path_to_id.get(r.media_item.file_path)
+            if r.success and file_id is not None:
+                item = r.media_item
+                self._thumb_pool.submit(generate_pyramid, file_id, item.file_path, item.media_type, cache_dir, item.duration)
         
-    def process_folder(self, root_dir: str, force_reprocess: bool = False, exclude_dirs: List[str] = None) -> Generator[dict, None, None]:
+    def _decode_images(self, paths: List[str], min_side: Optional[int] = None) -> List[tuple]:
+        """
+        (rgb array, original size, error) per path, decoded in worker processes; threads
+        if the pool breaks. min_side lets JPEGs downscale at decode time (see load_rgb_np).
+        """
+        decode = partial(decode_rgb_np, min_side=min_side)
+        if self._decode_pool is None:
+            self._decode_pool = ProcessPoolExecutor(max_workers=Config.DECODE_WORKERS)
+        try:
+            return list(self._decode_pool.map(decode, paths, chunksize=4))
+        except BrokenProcessPool as e:
+            print(f"Decode workers died, loading on threads: {e}")
+            self._decode_pool = None
+            return list(self._load_pool.map(decode, paths))
+        
+    def process_folder(self, root_dir: str, force_reprocess: bool = False, exclude_dirs: List[str] = None,
+                       status_cb: Optional[Callable[[int, int, str, int, float, bool], None]] = None) -> Generator[dict, None, None]:
         """
         Process all files in the directory.
         Yields status dictionaries.
+        With status_cb, per-file progress is reported as status_cb(current, total, filename,
+        newly_processed, eta, total_final) instead, and only 'error' / 'complete' dicts are yielded.
+        The directory is walked in the background while files are processed, so `total`
+        (and the ETA) is a running lower bound until total_final is True.
         """
         import time
         start_time = time.time()
         
-        # 1. Pre-scan for count
-        all_files = list(self.scanner.scan_directory(root_dir, exclude_dirs=exclude_dirs))
-        total_files = len(all_files)
-        
+        # 1. Walk in the background; processing starts with the first file found
+        walk = BackgroundIterator(self.scanner.scan_directory_parallel(root_dir, exclude_dirs, Config.SCAN_WORKERS))
+        try:
+            yield from self._process_files(walk, force_reprocess, start_time, status_cb)
+        finally:
+            walk.close()
+
+    def _process_files(self, walk: BackgroundIterator, force_reprocess: bool, start_time: float,
+                       status_cb: Optional[Callable]) -> Generator[dict, None, None]:
+        import time
         count = 0
         processed_new = 0
+        last_emit = 0.0
         
-        for file_path in all_files:
-            count += 1
-            try:
-                item = self.scanner.inspect_file(file_path)
-                
-                is_skip = not force_reprocess and self.db_manager.is_file_processed(item.file_path, item.file_hash)
-                
-                if not is_skip:
-                    result = self._process_item(item)
-                    self.db_manager.add_result(result)
-                    processed_new += 1
-                
-                # Yield progress
-                elapsed = time.time() - start_time
-                avg = elapsed / count
-                eta = (total_files - count) * avg
-                
-                yield {
-                    'current': count,
-                    'total': total_files,
-                    'newly_processed': processed_new,
-                    'filename': os.path.basename(file_path),
-                    'eta': eta,
-                    'elapsed': elapsed
-                }
-                
-            except Exception as e:
-                yield {'error': str(e), 'filename': os.path.basename(file_path)}
-                item.error_msg = str(e)
-                fail_result = ProcessingResult(item.file_path, False, item)
-                self.db_manager.add_result(fail_result)
+        # Inspect and check the DB a chunk of files at a time (fingerprints in parallel,
+        # one processed-state query), then process the chunk file by file
+        entries = iter(walk)
+        while chunk := list(islice(entries, self.INSPECT_CHUNK)):
+            items = self._inspect_chunk(chunk)
+            if force_reprocess:
+                todo = None
+            else:
+                todo = self.db_manager.filter_unprocessed(
+                    [(item.file_path, item.file_hash) for item in items if isinstance(item, MediaItem)])
+            
+            for entry, item in zip(chunk, items):
+                count += 1
+                file_path = entry.path
+                total_files, total_final = walk.produced, walk.done
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    
+                    if todo is None or item.file_path in todo:
+                        result = self._process_item(item)
+                        file_id = self.db_manager.add_result(result)
+                        self._queue_thumbnails([result], {item.file_path: file_id})
+                        processed_new += 1
+                    
+                    # Yield progress, at most every PROGRESS_INTERVAL seconds (and always for the last file)
+                    now = time.time()
+                    if now - last_emit < self.PROGRESS_INTERVAL and not (walk.done and count == walk.produced):
+                        continue
+                    last_emit = now
+                    elapsed = now - start_time
+                    avg = elapsed / count
+                    eta = (total_files - count) * avg
+                    
+                    if status_cb is not None:
+                        status_cb(count, total_files, os.path.basename(file_path), processed_new, eta, total_final)
+                        continue
+                    
+                    yield {
+                        'current': count,
+                        'total': total_files,
+                        'total_final': total_final,
+                        'newly_processed': processed_new,
+                        'filename': os.path.basename(file_path),
+                        'eta': eta,
+                        'elapsed': elapsed
+                    }
+                    
+                except Exception as e:
+                    yield {'error': str(e), 'filename': os.path.basename(file_path)}
+                    if isinstance(item, MediaItem):
+                        item.error_msg = str(e)
+                        fail_result = ProcessingResult(item.file_path, False, item)
+                        self.db_manager.add_result(fail_result)
 
+        self._ensure_clip_ann()
         yield {'status': 'complete', 'processed': processed_new, 'scanned': count}
 
     def _process_item(self, item: MediaItem) -> ProcessingResult:
-        """Analyze a single item."""
-        
-        vec_data = None
-        faces_data = []
-        
+        """Analyze a single item with the handler for its media type."""
         try:
-            if item.media_type == 'image':
-                # Open Image via ImageProcessor
-                img = ImageProcessor.load_image(item.file_path)
-                if img is None:
-                     raise ValueError("Image load failed or invalid format")
-                
-                item.width, item.height = img.size
-                
-                # Orchestrated Inference
-                res = self.inference.process_image(img)
-                
-                # Unpack Results
-                clip_vec = res['clip']
-                raw_faces = res['faces']
-                # Update Metadata via Manager
-                MetadataManager.update_item_tags(
-                    item, 
-                    char_tags=res['char_tags'], 
-                    series_tags=res['series_tags'], 
-                    style=res['style']
-                )
-
-                # Convert Faces
-                faces_data = MetadataManager.create_face_data(raw_faces)
-                face_vecs = [f.embedding for f in faces_data]
-
-                vec_data = VectorData(
-                    clip_vector=clip_vec,
-                    face_vectors=face_vecs
-                )
-                
-                item.is_processed = True
-
-            elif item.media_type == 'video':
-                # Use VideoProcessor
-                # It returns dictionary
-                res = self.video_processor.process_video(item.file_path)
-                if not res:
-                     raise ValueError("Video processing returned None")
-                
-                item.duration = res['duration']
-                item.fps = res['fps']
-                item.audio_transcription = res.get('audio_transcription', [])
-                item.frame_descriptions = res.get('frame_descriptions', [])
-                item.width = 0 # TODO: Get from decord if needed
-                item.height = 0
-                item.is_processed = True
-                
-                face_vecs = []
-                for f in res['faces']:
-                    face_vecs.append(f['embedding'].tolist())
-                    faces_data.append(FaceData(
-                        embedding=f['embedding'].tolist(),
-                        bbox=f['bbox'],
-                        det_score=f['det_score'],
-                        kps=f['kps'],
-                        timestamp=f.get('timestamp', 0)
-                    ))
-
-                vec_data = VectorData(
-                    clip_vector=res['clip_embedding'].tolist(),
-                    face_vectors=face_vecs
-                )
-                
-                # Auto Tagging (Using video clip embedding)
-                tags = self.auto_tagger.suggest_tags(np.array(res['clip_embedding']))[0]
-                item.tags = tags
-
-                # Character Tagging for Video (using representative frames or just avg?)
-                # For now, let's tag the middle frame or a few? VideoProcessor doesn't return frames yet.
-                # Simplest: Since we have the path, let's just do it again for video? 
-                # Actually let's modify VideoProcessor to return a keyframe!
-                # Or for now, skip video character tagging or do it simple.
-                # I'll just skip video for a moment to be safe on memory, or just take first frame.
-                try:
-                    import decord
-                    vr = decord.VideoReader(item.file_path)
-                    mid_frame = vr[len(vr)//2].asnumpy()
-                    res = self.inference.process_image(Image.fromarray(mid_frame))
-                    item.character_tags = res['char_tags']
-                    item.series_tags = res['series_tags']
-                except:
-                    pass
-
-            return ProcessingResult(
-                file_path=item.file_path,
-                success=True,
-                media_item=item,
-                vector_data=vec_data,
-                faces=faces_data
-            )
+            handler = self._handlers.get(item.media_type)
+            if handler is None:
+                raise ValueError(f"unknown media_type {item.media_type}")
+            return handler(item)
 
         except Exception as e:
             item.error_msg = str(e)
@@ -185,6 +250,84 @@ class Processor:
                 media_item=item
             )
 
+    def _process_image_item(self, item: MediaItem) -> ProcessingResult:
+        # Open Image via ImageProcessor
+        img = ImageProcessor.load_image(item.file_path)
+        if img is None:
+             raise ValueError("Image load failed or invalid format")
+        
+        item.width, item.height = img.size
+        # dHash for dedup from the already-decoded image
+        item.dhash = compute_dhash_from_pil(img)
+        
+        # Orchestrated Inference
+        res = self.inference.process_image(img)
+        
+        # Update Metadata via Manager
+        MetadataManager.update_item_tags(
+            item, 
+            char_tags=res['char_tags'], 
+            series_tags=res['series_tags'], 
+            style=res['style']
+        )
+
+        # Convert Faces
+        faces_data = MetadataManager.create_face_data(res['faces'])
+        vec_data = VectorData(
+            clip_vector=res['clip'],
+            face_vectors=[f.embedding for f in faces_data]
+        )
+        
+        item.is_processed = True
+        return ProcessingResult(
+            file_path=item.file_path,
+            success=True,
+            media_item=item,
+            vector_data=vec_data,
+            faces=faces_data
+        )
+
+    def _process_video_item(self, item: MediaItem) -> ProcessingResult:
+        # VideoProcessor returns a dictionary
+        res = self.video_processor.process_video(item.file_path)
+        if not res:
+             raise ValueError("Video processing returned None")
+        
+        item.duration = res['duration']
+        item.fps = res['fps']
+        item.audio_transcription = res.get('audio_transcription', [])
+        item.frame_descriptions = res.get('frame_descriptions', [])
+        item.width = 0 # TODO: Get from decord if needed
+        item.height = 0
+        item.is_processed = True
+        
+        faces_data = res['faces'] # FaceData, timestamped per frame
+        vec_data = VectorData(
+            clip_vector=res['clip_embedding'],
+            face_vectors=[f.embedding for f in faces_data]
+        )
+        
+        # Auto Tagging (Using video clip embedding)
+        item.tags = self.auto_tagger.suggest_tags(np.asarray(res['clip_embedding']))[0]
+
+        # Character Tagging for Video: the middle keyframe VideoProcessor already
+        # decoded and embedded, so no second open/seek or CLIP forward
+        mid = res.get('mid_frame')
+        if mid is not None:
+            try:
+                _, item.character_tags, item.series_tags = self.inference.tag_with_style(
+                    Image.fromarray(mid), res['mid_clip_embedding'])
+            except Exception as e:
+                print(f"Video character tagging failed for {item.file_path}: {e}")
+
+        return ProcessingResult(
+            file_path=item.file_path,
+            success=True,
+            media_item=item,
+            vector_data=vec_data,
+            faces=faces_data
+        )
+
     def process_folder_batch(self, root_dir: str, force_reprocess: bool = False, batch_size: int = 32, exclude_dirs: List[str] = None) -> Generator[str, None, None]:
         """
         Batch processing version.
@@ -192,52 +335,94 @@ class Processor:
         """
         print(f"Scanning directory (Batch Mode): {root_dir}")
         
-        buffer: List[MediaItem] = []
         count = 0
         
         # Generator to yield items from scanner
-        file_iter = self.scanner.scan_directory(root_dir, exclude_dirs=exclude_dirs)
+        file_iter = self.scanner.scan_directory_parallel(root_dir, exclude_dirs, Config.SCAN_WORKERS)
         
         try:
-            while True:
-                # Fill Buffer
-                try:
-                    while len(buffer) < batch_size:
-                        file_path = next(file_iter)
-                        
-                        # Inspection
-                        item = self.scanner.inspect_file(file_path)
-                        
-                        # DB Check
-                        if not force_reprocess and self.db_manager.is_file_processed(item.file_path, item.file_hash):
-                            continue
-                            
-                        buffer.append(item)
-                        
-                except StopIteration:
-                    # End of files
-                    pass
-                
-                if not buffer:
-                    break
-                    
+            for buffer in prefetch(self._iter_batches(file_iter, batch_size, force_reprocess)):
                 # Process Buffer
                 yield f"Batch Processing {len(buffer)} files..."
                 
                 results = self._process_batch(buffer)
                 
                 # Save Buffer
-                self.db_manager.add_results_batch(results)
+                path_to_id = self.db_manager.add_results_batch(results)
+                self._queue_thumbnails(results, path_to_id)
                 
                 count += len(buffer)
-                buffer.clear()
         
         except Exception as e:
             yield f"Fatal Batch Error: {e}"
             traceback.print_exc()
 
+        self._ensure_clip_ann()
         yield f"Completed! Processed {count} new files (Batch Mode)."
 
+    def _iter_batches(self, file_iter: Iterator[os.DirEntry], batch_size: int, force_reprocess: bool,
+                      check_size: int = 256) -> Iterator[List[MediaItem]]:
+        """Group scanned files that need processing into lists of up to batch_size items."""
+        buffer: List[MediaItem] = []
+        for chunk in self._iter_unprocessed(file_iter, force_reprocess, check_size):
+            for item in chunk:
+                buffer.append(item)
+                if len(buffer) >= batch_size:
+                    yield buffer
+                    buffer = []
+        if buffer:
+            yield buffer
+
+    def _iter_unprocessed(self, file_iter: Iterator[os.DirEntry], force_reprocess: bool, check_size: int) -> Iterator[List[MediaItem]]:
+        """Inspect files in chunks of check_size and drop processed ones with one DB query per chunk."""
+        pending: List[os.DirEntry] = []
+        for entry in file_iter:
+            pending.append(entry)
+            if len(pending) >= check_size:
+                yield self._drop_processed(self._inspect_files(pending), force_reprocess)
+                pending = []
+        if pending:
+            yield self._drop_processed(self._inspect_files(pending), force_reprocess)
+
+    def _inspect_chunk(self, entries: List[os.DirEntry]) -> List[Union[MediaItem, Exception]]:
+        """_inspect_files, falling back to one file at a time so a vanished file only fails itself."""
+        try:
+            return self._inspect_files(entries)
+        except Exception:
+            items = []
+            for entry in entries:
+                try:
+                    items.append(self._inspect_files([entry])[0])
+                except Exception as e:
+                    items.append(e)
+            return items
+
+    def _inspect_files(self, entries: List[os.DirEntry]) -> List[MediaItem]:
+        """
+        Inspect files with one stat each (from the scan's DirEntry), reusing the stored
+        hash of any file whose size and mtime are unchanged.
+        """
+        stats = dict(self.scanner.stat_entry(e) for e in entries)
+        cached = self.db_manager.get_cached_hashes({p: (st.st_size, st.st_mtime_ns) for p, st in stats.items()})
+        # Rows stored before stats were recorded hold the old MD5 fingerprint: verify it once
+        # and record the stat, so those files keep their hash and are not reprocessed
+        misses = [p for p in stats if p not in cached]
+        legacy = self.db_manager.get_unstamped_hashes(misses) if misses else {}
+        if legacy:
+            md5s = self.scanner.legacy_hashes([(p, stats[p]) for p in legacy])
+            verified = [p for p, md5 in zip(legacy, md5s) if md5 == legacy[p]]
+            if verified:
+                cached.update((p, legacy[p]) for p in verified)
+                self.db_manager.stamp_file_stats([(p, stats[p].st_size, stats[p].st_mtime_ns) for p in verified])
+        return self.scanner.inspect_batch(list(stats.items()), cached)
+
+    def _drop_processed(self, items: List[MediaItem], force_reprocess: bool) -> List[MediaItem]:
+        # DB Check
+        if force_reprocess:
+            return items
+        todo = self.db_manager.filter_unprocessed([(item.file_path, item.file_hash) for item in items])
+        return [item for item in items if item.file_path in todo]
+
     def _process_batch(self, items: List[MediaItem]) -> List[ProcessingResult]:
         """Process a list of items using batch inference where possible."""
         
@@ -254,33 +439,27 @@ class Processor:
         # 1. Process Images in Batch (CLIP)
         if images_to_process:
             try:
-                # Load all PIL images in parallel using threads
-                from concurrent.futures import ThreadPoolExecutor
+                # Decode all images in parallel in the decode worker processes
+                # Large JPEGs come back pre-shrunk; item dimensions are the file's own
+                decoded = self._decode_images([item.file_path for _, item in images_to_process], Config.DECODE_MIN_SIDE)
                 
-                def load_img(idx_item):
-                    idx, item = idx_item
-                    try:
-                        img = Image.open(item.file_path).convert('RGB')
-                        item.width, item.height = img.size
-                        return idx, img, None
-                    except Exception as e:
-                        return idx, None, str(e)
-
                 pil_images = []
                 loaded_indices = []
                 
-                # Using max_workers derived from CPU count or a sensible default
-                with ThreadPoolExecutor(max_workers=8) as executor:
-                    load_results = list(executor.map(load_img, images_to_process))
-                
-                for idx, img, error in load_results:
+                for (idx, item), (arr, size, error) in zip(images_to_process, decoded):
                     if error:
-                        item = items[idx]
                         item.error_msg = f"Load Error: {error}"
                         results.append(ProcessingResult(item.file_path, False, item))
                     else:
+                        img = Image.fromarray(arr)
+                        item.width, item.height = size
                         pil_images.append(img)
                         loaded_indices.append(idx)
+                
+                # dHash for dedup from the decoded images (cv2 releases the GIL)
+                dhashes = self._load_pool.map(compute_dhash_from_pil, pil_images)
+                for idx, dhash in zip(loaded_indices, dhashes):
+                    items[idx].dhash = dhash
 
                 if pil_images:
                     # Run Orchestrated Inference Batch (CLIP, Faces, Style, Char Tag)
@@ -301,18 +480,10 @@ class Processor:
                         item.character_tags = res['char_tags']
                         item.series_tags = res['series_tags']
                         
-                        clip_v = res['clip'].tolist() if hasattr(res['clip'], 'tolist') else res['clip']
+                        clip_v = res['clip']
                         
-                        faces_data = []
-                        f_vecs = []
-                        for f in res['faces']:
-                             f_vecs.append(f['embedding'].tolist())
-                             faces_data.append(FaceData(
-                                embedding=f['embedding'].tolist(),
-                                bbox=f['bbox'],
-                                det_score=f['det_score'],
-                                kps=f['kps']
-                            ))
+                        faces_data = MetadataManager.create_face_data(res['faces'])
+                        f_vecs = [f.embedding for f in faces_data]
                             
                         vec_data = VectorData(clip_vector=clip_v, face_vectors=f_vecs)
                         item.is_processed = True
@@ -366,26 +537,31 @@ class Processor:
                         batch_mapping.append((v_idx, f_i))
                 
                 if all_frames:
+                    # Audio extraction for every loaded video starts now and overlaps the
+                    # frame inference below; transcripts are collected per video when finalizing
+                    audio_jobs = {v_idx: self.video_processor.submit_audio(res['path'])
+                                  for v_idx, res in enumerate(valid_vid_results) if res}
+                    
                     # Batch Inference via Orchestrator
                     batch_results = self.inference.process_batch(all_frames)
                     
                     # 4. Aggregate results back to videos
-                    video_outputs = {v_idx: {'clips': [], 'faces': [], 'char_tags': [], 'series_tags': [], 'styles': []} for v_idx in range(len(vid_results))}
+                    # CLIP vectors are summed in place per video rather than stacked for a mean
+                    video_outputs = {v_idx: {'clip_sum': np.zeros(768, dtype=np.float32), 'clip_n': 0, 'faces': [], 'char_tags': [], 'series_tags': [], 'styles': []} for v_idx in range(len(vid_results))}
                     for global_idx, (v_idx, f_idx) in enumerate(batch_mapping):
                         res = batch_results[global_idx]
                         
-                        video_outputs[v_idx]['clips'].append(res['clip'])
+                        np.add(video_outputs[v_idx]['clip_sum'], res['clip'], out=video_outputs[v_idx]['clip_sum'])
+                        video_outputs[v_idx]['clip_n'] += 1
                         video_outputs[v_idx]['styles'].append(res['style'])
                         
                         # Add timestamp to faces
-                        faces = res['faces']
+                        ts = 0
                         vid_res = valid_vid_results[v_idx]
                         if vid_res:
                             fps = vid_res['fps']
                             ts = vid_res['indices'][f_idx] / fps if fps > 0 else 0
-                            for f in faces:
-                                f['timestamp'] = ts
-                        video_outputs[v_idx]['faces'].extend(faces)
+                        video_outputs[v_idx]['faces'].extend(MetadataManager.create_face_data(res['faces'], ts))
                         
                         # Tags
                         c_t = res['char_tags']
@@ -395,6 +571,15 @@ class Processor:
                         
                         # Add timestamp to faces
                     
+                    # Action descriptions for every keyframe of the batch, in batched VLM calls
+                    answers = self.video_processor.describe_frames(all_frames)
+                    video_descriptions = {v_idx: [] for v_idx in range(len(vid_results))}
+                    for (v_idx, f_idx), text in zip(batch_mapping, answers):
+                        if text:
+                            vid_res = valid_vid_results[v_idx]
+                            ts = vid_res['indices'][f_idx] / vid_res['fps'] if vid_res['fps'] > 0 else 0
+                            video_descriptions[v_idx].append({'timestamp': ts, 'text': text})
+                    
                     # Finalize each video
                     for v_idx, res in enumerate(valid_vid_results):
                         if not res: continue
@@ -406,36 +591,10 @@ class Processor:
                         item.height = 0
                         item.is_processed = True
                         
-                        # Sequential fallback for Video Understanding in Batch Mode
-                        from .video_processor import VideoProcessor
-                        import tempfile
-                        import subprocess
-                        import os
-                        audio_transcription = []
-                        try:
-                            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_audio:
-                                tmp_path = tmp_audio.name
-                            cmd = ['ffmpeg', '-y', '-i', item.file_path, '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', tmp_path]
-                            if subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
-                                audio_transcription = self.ai_engine.transcribe_audio(tmp_path)
-                            if os.path.exists(tmp_path):
-                                os.remove(tmp_path)
-                        except:
-                            pass
-                        item.audio_transcription = audio_transcription
+                        # Whisper transcribes one file at a time; later extractions keep running meanwhile
+                        item.audio_transcription = self.video_processor.transcribe_extracted(audio_jobs[v_idx])
                         
-                        frame_descriptions = []
-                        if hasattr(self.video_processor, 'vlm_engine'):
-                            try:
-                                for f_idx, frame_np in enumerate(res['frames']):
-                                    pil_img = Image.fromarray(frame_np)
-                                    action_text = self.video_processor.vlm_engine.ask_image(pil_img, "Describe the main action or subject in this image in one short sentence.")
-                                    if not action_text.startswith("Error"):
-                                        ts = res['indices'][f_idx] / res['fps'] if res['fps'] > 0 else 0
-                                        frame_descriptions.append({'timestamp': ts, 'text': action_text})
-                            except Exception as e:
-                                print(f"Batch VLM Error: {e}")
-                        item.frame_descriptions = frame_descriptions
+                        item.frame_descriptions = video_descriptions[v_idx]
                         
                         outputs = video_outputs[v_idx]
                         
@@ -447,15 +606,11 @@ class Processor:
                         else:
                             main_style = "illustration"
 
-                        # Auto Tag (on avg clip)
-                        clips = np.array(outputs['clips'])
-                        if len(clips) > 0:
-                            avg_clip = np.mean(clips, axis=0)
-                            avg_clip /= np.linalg.norm(avg_clip)
-                        else:
-                            avg_clip = np.zeros(768)
+                        # Auto Tag (on avg clip; all zeros when no frame was embedded)
+                        avg_clip = outputs['clip_sum'] / max(outputs['clip_n'], 1)
+                        avg_clip /= np.linalg.norm(avg_clip) + 1e-12
                             
-                        auto_tags = self.auto_tagger.suggest_tags(np.array([avg_clip]))[0]
+                        auto_tags = self.auto_tagger.suggest_tags(avg_clip)[0]
                         
                         # Update Metadata
                         MetadataManager.update_item_tags(
@@ -467,10 +622,10 @@ class Processor:
                         )
                         
                         # Faces
-                        item_faces = MetadataManager.create_face_data(outputs['faces'])
+                        item_faces = outputs['faces']
                         f_vecs = [f.embedding for f in item_faces]
                             
-                        vec_data = VectorData(clip_vector=avg_clip.tolist(), face_vectors=f_vecs)
+                        vec_data = VectorData(clip_vector=avg_clip, face_vectors=f_vecs)
                         
                         results.append(ProcessingResult(
                             file_path=item.file_path,
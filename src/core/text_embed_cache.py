@@ -0,0 +1,58 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class TextEmbeddingCache:
+    """
+    Persistent text -> embedding cache.
+    Rows are keyed by sha256("{model_id}|{text}") and hold the raw float32 vector,
+    so a repeated query (or a warm start's prompt set) skips the text encoder.
+    """
+
+    def __init__(self, path: str, model_id: str, dim: int):
+        self.path = path
+        self.model_id = model_id
+        self.dim = dim
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute('CREATE TABLE IF NOT EXISTS text_embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL) WITHOUT ROWID')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_id}|{text}".encode('utf-8')).digest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        row = self._conn().execute('SELECT vec FROM text_embeddings WHERE hash = ?', (self._key(text),)).fetchone()
+        if row is None or len(row[0]) != self.dim * 4:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).copy()
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for whichever of `texts` are present."""
+        found = {}
+        for text in texts:
+            vec = self.get(text)
+            if vec is not None:
+                found[text] = vec
+        return found
+
+    def put(self, text: str, vec: np.ndarray):
+        self.put_many({text: vec})
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        rows = [(self._key(t), np.ascontiguousarray(v, dtype=np.float32).tobytes()) for t, v in vectors.items()]
+        self._conn().executemany('INSERT OR REPLACE INTO text_embeddings (hash, vec) VALUES (?, ?)', rows)
@@ -0,0 +1,266 @@
+"""
+Thumbnail rendering for the gallery.
+
+Uses libvips (pyvips) when available: `thumbnail` shrinks JPEGs in the DCT
+domain on load and decodes sequentially, so the full-resolution pixel buffer
+is never materialized. Falls back to PIL when libvips is not installed.
+
+Thumbnails are encoded as AVIF or WebP when the client accepts them (and the
+local codecs support them), JPEG otherwise.
+"""
+import io
+import os
+import subprocess
+import tempfile
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import pyvips
+    HAS_VIPS = True
+except (ImportError, OSError):  # OSError: binding present but libvips DLLs missing
+    HAS_VIPS = False
+
+PLACEHOLDER_COLOR = (20, 20, 20)
+
+# format -> (file extension, MIME type), in order of preference
+THUMBNAIL_FORMATS = {
+    'avif': ('avif', 'image/avif'),
+    'webp': ('webp', 'image/webp'),
+    'jpeg': ('jpg', 'image/jpeg'),
+}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+# Sizes pre-generated at ingest; requested sizes are snapped up to the nearest step
+PYRAMID_SIZES = (128, 256, 512, 1024)
+
+
+# Suppress console windows for ffmpeg/ffprobe on Windows
+_CREATIONFLAGS = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+
+def _probe_duration(path: str) -> Optional[float]:
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', path]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=15, creationflags=_CREATIONFLAGS)
+        return float(res.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+def video_frame_jpeg(path: str, size: Optional[int] = None, duration: Optional[float] = None) -> Optional[bytes]:
+    """
+    Grab the middle frame of a video as JPEG bytes with a single ffmpeg seek.
+    `-ss` before `-i` jumps to the nearest keyframe, so only one frame is decoded.
+    Returns None if ffmpeg is unavailable or fails.
+    """
+    if not duration:
+        duration = _probe_duration(path)
+    seek = duration / 2 if duration else 0.0
+
+    cmd = ['ffmpeg', '-v', 'error', '-ss', f"{seek:.3f}", '-i', path, '-frames:v', '1']
+    if size:
+        cmd += ['-vf', f"scale='min({size},iw)':'min({size},ih)':force_original_aspect_ratio=decrease"]
+    cmd += ['-q:v', '3', '-f', 'image2pipe', '-vcodec', 'mjpeg', '-']
+    try:
+        res = subprocess.run(cmd, capture_output=True, timeout=30, creationflags=_CREATIONFLAGS)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"ffmpeg frame grab failed for {path}: {e}")
+        return None
+    if res.returncode != 0 or not res.stdout:
+        return None
+    return res.stdout
+
+
+def _video_mid_frame(path: str):
+    """Decode the middle frame of a video as an RGB uint8 array with decord, or None."""
+    try:
+        import decord
+        vr = decord.VideoReader(path)
+        return vr[len(vr) // 2].asnumpy()
+    except Exception as e:
+        print(f"Video Thumbnail Error for {path}: {e}")
+        return None
+
+
+def load_video_frame(path: str) -> Optional[Image.Image]:
+    """Middle frame of a video as an RGB PIL image (ffmpeg seek, decord fallback)."""
+    data = video_frame_jpeg(path)
+    if data is not None:
+        return Image.open(io.BytesIO(data)).convert('RGB')
+    frame = _video_mid_frame(path)
+    return Image.fromarray(frame).convert('RGB') if frame is not None else None
+
+
+def _load_vips(path: str, media_type: str, size: int, duration: Optional[float] = None):
+    if media_type == 'video':
+        data = video_frame_jpeg(path, size, duration)
+        if data is not None:
+            img = pyvips.Image.new_from_buffer(data, '')
+        else:
+            frame = _video_mid_frame(path)
+            if frame is None:
+                return None
+            img = pyvips.Image.new_from_array(frame).copy(interpretation='srgb')
+            img = img.thumbnail_image(size, height=size, size='down')
+    else:
+        try:
+            img = pyvips.Image.thumbnail(path, size, height=size, size='down')
+        except pyvips.Error as e:
+            print(f"Image load Error for {path}: {e}")
+            return None
+
+    # Encoders need 8-bit sRGB without alpha
+    if img.interpretation != 'srgb':
+        img = img.colourspace('srgb')
+    if img.hasalpha():
+        img = img.flatten(background=[0, 0, 0])
+    return img.cast('uchar')
+
+
+def _load_pil(path: str, media_type: str, size: int, duration: Optional[float] = None) -> Optional[Image.Image]:
+    if media_type == 'video':
+        data = video_frame_jpeg(path, size, duration)
+        if data is not None:
+            img = Image.open(io.BytesIO(data))
+        else:
+            frame = _video_mid_frame(path)
+            if frame is None:
+                return None
+            img = Image.fromarray(frame)
+    else:
+        try:
+            img = Image.open(path)
+            img.draft('RGB', (size, size))  # JPEG shrink-on-load
+        except Exception as e:
+            print(f"Image load Error for {path}: {e}")
+            return None
+
+    img.thumbnail((size, size))  # Preserves aspect ratio
+    return img.convert('RGB')
+
+
+def _render(path: str, media_type: str, size: int, duration: Optional[float] = None):
+    if HAS_VIPS:
+        img = _load_vips(path, media_type, size, duration)
+    else:
+        img = _load_pil(path, media_type, size, duration)
+    if img is None:
+        img = Image.new('RGB', (size, size), color=PLACEHOLDER_COLOR)
+    return img
+
+
+def _encode(img, fmt: str) -> bytes:
+    if isinstance(img, Image.Image):
+        buf = io.BytesIO()
+        if fmt == 'avif':
+            img.save(buf, format="AVIF", quality=AVIF_QUALITY)
+        elif fmt == 'webp':
+            img.save(buf, format="WEBP", quality=WEBP_QUALITY, method=3)
+        else:
+            img.save(buf, format="JPEG", quality=JPEG_QUALITY)
+        return buf.getvalue()
+
+    if fmt == 'avif':
+        return img.heifsave_buffer(Q=AVIF_QUALITY, compression='av1', strip=True)
+    if fmt == 'webp':
+        return img.webpsave_buffer(Q=WEBP_QUALITY, effort=3, strip=True)
+    return img.jpegsave_buffer(Q=JPEG_QUALITY, strip=True, interlace=False)
+
+
+@lru_cache(maxsize=None)
+def format_supported(fmt: str) -> bool:
+    """Whether the active backend can encode fmt (probed once with a tiny image)."""
+    if fmt == 'jpeg':
+        return True
+    try:
+        probe = pyvips.Image.black(8, 8, bands=3) if HAS_VIPS else Image.new('RGB', (8, 8))
+        return len(_encode(probe, fmt)) > 0
+    except Exception:
+        return False
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Pick the preferred thumbnail format that the client accepts and we can encode."""
+    accept = accept or ''
+    for fmt, (_, mime) in THUMBNAIL_FORMATS.items():
+        if fmt != 'jpeg' and mime in accept and format_supported(fmt):
+            return fmt
+    return 'jpeg'
+
+
+def snap_size(size: int) -> int:
+    """Smallest pyramid step that is at least `size` (capped at the largest step)."""
+    for step in PYRAMID_SIZES:
+        if size <= step:
+            return step
+    return PYRAMID_SIZES[-1]
+
+
+def cache_path(cache_dir: str, file_id: int, size: int, fmt: str) -> str:
+    return os.path.join(cache_dir, f"{file_id}_{size}.{THUMBNAIL_FORMATS[fmt][0]}")
+
+
+def negotiable_formats() -> Tuple[str, ...]:
+    """Every format negotiate_format can pick with the local codecs (always includes JPEG)."""
+    return tuple(fmt for fmt in THUMBNAIL_FORMATS if format_supported(fmt))
+
+
+def _write_atomic(out_path: str, data: bytes):
+    # Unique temp file per call: request threads may render the same thumbnail concurrently
+    f = tempfile.NamedTemporaryFile(dir=os.path.dirname(out_path), suffix='.tmp', delete=False)
+    try:
+        with f:
+            f.write(data)
+        os.replace(f.name, out_path)  # after close: Windows can't replace an open file
+    finally:
+        if os.path.exists(f.name):  # only when the write or replace failed
+            os.remove(f.name)
+
+
+def _downscale(img, size: int):
+    if isinstance(img, Image.Image):
+        small = img.copy()
+        small.thumbnail((size, size))
+        return small
+    return img.thumbnail_image(size, height=size, size='down')
+
+
+def save_thumbnail(path: str, media_type: str, size: int, out_path: str,
+                   duration: Optional[float] = None, fmt: str = 'jpeg'):
+    """Render a thumbnail bounded to size x size and write it atomically to out_path."""
+    _write_atomic(out_path, thumbnail_bytes(path, media_type, size, duration, fmt))
+
+
+def thumbnail_bytes(path: str, media_type: str, size: int,
+                    duration: Optional[float] = None, fmt: str = 'jpeg') -> bytes:
+    """Same as save_thumbnail, but returns the encoded image instead of writing it."""
+    if media_type == 'video' and fmt == 'jpeg':
+        # ffmpeg already produces a scaled JPEG; pass it through as-is
+        data = video_frame_jpeg(path, size, duration)
+        if data is not None:
+            return data
+    return _encode(_render(path, media_type, size, duration), fmt)
+
+
+def generate_pyramid(file_id: int, path: str, media_type: str, cache_dir: str,
+                     duration: Optional[float] = None, formats: Optional[Iterable[str]] = None):
+    """
+    Render all PYRAMID_SIZES thumbnails for one file from a single decode, in
+    every negotiable format (so no Accept header falls through to a request-thread
+    render), replacing any cached ones. Meant to run in a worker process at ingest.
+    """
+    formats = tuple(formats or negotiable_formats())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        img = _render(path, media_type, PYRAMID_SIZES[-1], duration)
+        for size in sorted(PYRAMID_SIZES, reverse=True):
+            img = _downscale(img, size)
+            for fmt in formats:
+                _write_atomic(cache_path(cache_dir, file_id, size, fmt), _encode(img, fmt))
+    except Exception as e:
+        print(f"Thumbnail pyramid failed for {path}: {e}")
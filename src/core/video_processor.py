@@ -4,20 +4,89 @@ import numpy as np
 from PIL import Image
 import decord
 from decord import VideoReader, cpu, gpu
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Optional, Union
 import tempfile
 import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
 from .ai_models import AIEngine
 from .vlm_engine import VLMEngine
+from .metadata import MetadataManager
+
+ACTION_PROMPT = "Describe the main action or subject in this image in one short sentence."
+# Keyframes per VLM generate call
+VLM_BATCH = 16
+# ffmpeg audio extractions run at once
+AUDIO_WORKERS = 4
 
 class VideoProcessor:
     def __init__(self):
         self.ai_engine = AIEngine()
         self._vlm_engine = None  # lazy-loaded on first use
+        # Concurrent ffmpeg audio extractions (threads only wait on the subprocess)
+        self._audio_pool = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="audio")
         # Determine device for decord
         # Use CPU by default as decord GPU requires custom builds on windows
         self.ctx = decord.cpu(0)
 
+    @property
+    def vlm_engine(self) -> VLMEngine:
+        """VLMEngine, created on first use."""
+        if self._vlm_engine is None:
+            self._vlm_engine = VLMEngine()
+        return self._vlm_engine
+
+    def describe_frames(self, images: List[Image.Image]) -> List[Optional[str]]:
+        """
+        One-sentence action description per frame, from batched VLM calls of up to VLM_BATCH frames.
+        Frames in a failed call get None.
+        """
+        answers = []
+        for start in range(0, len(images), VLM_BATCH):
+            chunk = images[start:start + VLM_BATCH]
+            try:
+                answers.extend(self.vlm_engine.ask_image_batch(chunk, [ACTION_PROMPT] * len(chunk)))
+            except Exception as e:
+                print(f"VLM prediction failed for frames: {e}")
+                answers.extend([None] * len(chunk))
+        return answers
+
+    def extract_audio(self, video_path: str) -> Optional[str]:
+        """
+        Extract the audio track at 16kHz mono (what Whisper expects) into a temp WAV.
+        Returns its path (the caller removes it), or None when there is no audio or ffmpeg fails.
+        """
+        tmp_audio_path = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_audio:
+                tmp_audio_path = tmp_audio.name
+            cmd = ['ffmpeg', '-y', '-i', video_path, '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', tmp_audio_path]
+            # Use subprocess to run ffmpeg, supressing output
+            if subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+                return tmp_audio_path
+        except Exception as e:
+            print(f"Failed to extract audio for {video_path}: {e}")
+        if tmp_audio_path and os.path.exists(tmp_audio_path):
+            os.remove(tmp_audio_path)
+        return None
+
+    def submit_audio(self, video_path: str) -> Future:
+        """
+        Start extract_audio on the audio pool. ffmpeg runs as its own process, so several
+        extractions overlap each other and whatever the caller does meanwhile.
+        """
+        return self._audio_pool.submit(self.extract_audio, video_path)
+
+    def transcribe_extracted(self, audio_future: Future) -> List[Dict[str, Any]]:
+        """Wait for a submit_audio job, transcribe the WAV and remove it."""
+        tmp_audio_path = audio_future.result()
+        if tmp_audio_path is None:
+            return []
+        try:
+            return self.ai_engine.transcribe_audio(tmp_audio_path)
+        finally:
+            if os.path.exists(tmp_audio_path):
+                os.remove(tmp_audio_path)
+
     def _get_frame_indices(self, vr: VideoReader) -> List[int]:
         """
         Calculate indices for Start+10s, 25%, Middle, 75%, End-10s.
@@ -116,41 +185,18 @@ class VideoProcessor:
         duration = frame_count / fps if fps > 0 else 0
         
         # Extract Audio and Transcribe
-        audio_transcription = []
-        try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_audio:
-                tmp_audio_path = tmp_audio.name
-            
-            # Extract audio at 16kHz for whisper
-            cmd = ['ffmpeg', '-y', '-i', video_path, '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', tmp_audio_path]
-            # Use subprocess to run ffmpeg, supressing output
-            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if result.returncode == 0:
-                audio_transcription = self.ai_engine.transcribe_audio(tmp_audio_path)
-            
-            if os.path.exists(tmp_audio_path):
-                os.remove(tmp_audio_path)
-        except Exception as e:
-            print(f"Failed to process audio for {video_path}: {e}")
-            if 'tmp_audio_path' in locals() and os.path.exists(tmp_audio_path):
-                os.remove(tmp_audio_path)
+        audio_transcription = self.transcribe_extracted(self.submit_audio(video_path))
         
         # Extract Frames
         indices = self._get_frame_indices(vr)
         frames = vr.get_batch(indices).asnumpy() # (N, H, W, C)
         
-        clip_embeddings = []
+        # 1. CLIP Embeddings for all keyframes at once (Decord returns RGB; preprocessed on device)
+        clip_embeddings = list(self.ai_engine.extract_clip_features_np(frames)) if len(frames) else []
         all_faces = []
-        frame_descriptions = []
+        timestamps = []
         
         for i, frame_np in enumerate(frames):
-            # frame_np is numpy array (RGB or BGR depending on decord?)
-            # Decord returns RGB by default.
-            
-            # 1. CLIP Embedding (Needs PIL RGB)
-            pil_img = Image.fromarray(frame_np)
-            clip_vec = self.ai_engine.extract_clip_feature(pil_img)
-            clip_embeddings.append(clip_vec)
             
             # 2. Face Detection (Needs BGR for InsightFace)
             # Convert RGB to BGR
@@ -159,23 +205,15 @@ class VideoProcessor:
             
             # Add timestamp info to face
             timestamp = indices[i] / fps if fps > 0 else 0
-            for face in faces:
-                face['timestamp'] = timestamp
-                all_faces.append(face)
+            timestamps.append(timestamp)
+            all_faces.extend(MetadataManager.create_face_data(faces, timestamp))
 
-            # 3. Action Recognition (Moondream VLM) - lazy-load VLMEngine
-            try:
-                if self._vlm_engine is None:
-                    from .vlm_engine import VLMEngine as _VLMEngine
-                    self._vlm_engine = _VLMEngine()
-                action_text = self._vlm_engine.ask_image(pil_img, "Describe the main action or subject in this image in one short sentence.")
-                if not action_text.startswith("Error"):
-                    frame_descriptions.append({
-                        'timestamp': timestamp,
-                        'text': action_text
-                    })
-            except Exception as e:
-                print(f"VLM prediction failed for frame: {e}")
+        # 3. Action Recognition (Moondream VLM), all keyframes in batched calls
+        answers = self.describe_frames([Image.fromarray(f) for f in frames]) if len(frames) else []
+        frame_descriptions = [{'timestamp': ts, 'text': text} for ts, text in zip(timestamps, answers) if text]
+
+        # The middle keyframe (always among the indices) is reused for character tagging
+        mid = indices.index(max(0, min(frame_count // 2, frame_count - 1))) if len(frames) else None
 
         # Average CLIP embeddings
         if clip_embeddings:
@@ -190,7 +228,9 @@ class VideoProcessor:
             'fps': fps,
             'frame_count': frame_count,
             'clip_embedding': avg_clip_embedding, # (768,)
-            'faces': all_faces, # List of dicts
+            'faces': all_faces, # List of FaceData
             'audio_transcription': audio_transcription,
-            'frame_descriptions': frame_descriptions
+            'frame_descriptions': frame_descriptions,
+            'mid_frame': frames[mid] if mid is not None else None, # (H, W, C) RGB
+            'mid_clip_embedding': clip_embeddings[mid] if mid is not None else None
         }
@@ -1,6 +1,7 @@
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from PIL import Image
+from typing import List
 import threading
 
 class VLMEngine:
@@ -91,29 +92,7 @@ class VLMEngine:
 
             try:
                 with torch.no_grad():
-                    # Workaround for huggingface transformers missing tokens in some Phi configs
-                    # PhiConfig overrides __getattribute__ and throws AttributeError, so we use try/except
-                    try:
-                        _ = self.model.config.pad_token_id
-                    except AttributeError:
-                        self.model.config.pad_token_id = self.tokenizer.eos_token_id
-                        
-                    try:
-                        _ = self.model.config.bos_token_id
-                    except AttributeError:
-                        self.model.config.bos_token_id = self.tokenizer.bos_token_id or self.tokenizer.eos_token_id
-                    
-                    if hasattr(self.model, "generation_config"):
-                        try:
-                            _ = self.model.generation_config.pad_token_id
-                        except AttributeError:
-                            self.model.generation_config.pad_token_id = self.tokenizer.eos_token_id
-                            
-                        try:
-                            _ = self.model.generation_config.bos_token_id
-                        except AttributeError:
-                            self.model.generation_config.bos_token_id = self.tokenizer.bos_token_id or self.tokenizer.eos_token_id
-
+                    self._ensure_token_ids()
                     # moondream2 API
                     encoded_image = self.model.encode_image(image)
                     answer = self.model.answer_question(encoded_image, prompt, self.tokenizer)
@@ -122,6 +101,49 @@ class VLMEngine:
                  print(f"Error during VLM inference: {e}")
                  return f"Error: {str(e)}"
 
+    def ask_image_batch(self, images: List[Image.Image], prompts: List[str]) -> List[str]:
+        """
+        Ask one question per image in a single batched generate call.
+        Raises on inference errors so the caller can fail the whole batch.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load_model_unlocked()
+
+            if not self._loaded or self.model is None:
+                raise RuntimeError("VLM model is not loaded.")
+
+            with torch.no_grad():
+                self._ensure_token_ids()
+                if len(images) > 1 and hasattr(self.model, "batch_answer"):
+                    return list(self.model.batch_answer(images, prompts, self.tokenizer))
+                return [self.model.answer_question(self.model.encode_image(img), prompt, self.tokenizer)
+                        for img, prompt in zip(images, prompts)]
+
+    def _ensure_token_ids(self):
+        # Workaround for huggingface transformers missing tokens in some Phi configs
+        # PhiConfig overrides __getattribute__ and throws AttributeError, so we use try/except
+        try:
+            _ = self.model.config.pad_token_id
+        except AttributeError:
+            self.model.config.pad_token_id = self.tokenizer.eos_token_id
+            
+        try:
+            _ = self.model.config.bos_token_id
+        except AttributeError:
+            self.model.config.bos_token_id = self.tokenizer.bos_token_id or self.tokenizer.eos_token_id
+        
+        if hasattr(self.model, "generation_config"):
+            try:
+                _ = self.model.generation_config.pad_token_id
+            except AttributeError:
+                self.model.generation_config.pad_token_id = self.tokenizer.eos_token_id
+                
+            try:
+                _ = self.model.generation_config.bos_token_id
+            except AttributeError:
+                self.model.generation_config.bos_token_id = self.tokenizer.bos_token_id or self.tokenizer.eos_token_id
+
     def unload(self):
         """Free VRAM when not in use."""
         with self._lock:
@@ -0,0 +1,47 @@
+"""
+Persistent Whisper transcription worker.
+
+Run as `python -m src.core.whisper_worker`. It lives in its own process to keep
+ctranslate2 away from onnxruntime-gpu's DLLs in the main process. The model is
+loaded once, then requests are served over a JSON-lines protocol:
+
+    stdin:  {"path": "/abs/audio.wav"}
+    stdout: [{"start": 0.0, "end": 2.5, "text": "..."}, ...]   or   {"error": "..."}
+"""
+import json
+import os
+import sys
+
+
+def main():
+    # Keep the protocol stream clean: anything else written to stdout, including
+    # native-library warnings on fd 1, goes to stderr instead
+    proto = os.fdopen(os.dup(1), 'w', encoding='utf-8', buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    try:
+        from faster_whisper import WhisperModel
+        model = WhisperModel('base', device='cpu', compute_type='int8')
+    except Exception as e:
+        model, load_error = None, str(e)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            if model is None:
+                raise RuntimeError(f"Whisper model failed to load: {load_error}")
+            req = json.loads(line)
+            segs, _ = model.transcribe(req['path'], beam_size=5)
+            out = [{'start': s.start, 'end': s.end, 'text': s.text.strip()} for s in segs]
+        except Exception as e:
+            import traceback
+            traceback.print_exc(file=sys.stderr)
+            out = {'error': str(e)}
+        proto.write(json.dumps(out) + '\n')
+        proto.flush()
+
+
+if __name__ == '__main__':
+    main()
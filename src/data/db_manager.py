@@ -6,8 +6,24 @@ import os
 import pickle
 import faiss
 import json
-from typing import List, Optional, Tuple, Dict
+import threading
+from typing import List, Optional, Set, Tuple, Dict
 from .schemas import MediaItem, VectorData, ProcessingResult
+from ..config import Config
+
+# Normalized label tables: (table, value column), same order as
+# MediaItem.tags / character_tags / series_tags
+LABEL_TABLES = [
+    ('file_tags', 'tag'),
+    ('file_characters', 'name'),
+    ('file_series', 'name'),
+]
+
+# Full-text queries shorter than this cannot use the trigram index
+FTS_MIN_QUERY_LEN = 3
+
+# JSON1 functions (json_each etc.) are built in from SQLite 3.38
+HAS_JSON1 = sqlite3.sqlite_version_info >= (3, 38, 0)
 
 class DBManager:
     def __init__(self, db_dir: str = "data/db"):
@@ -17,15 +33,57 @@ class DBManager:
         self.sqlite_path = os.path.join(db_dir, "metadata.db")
         self.faiss_path = os.path.join(db_dir, "vectors.index")
         self.face_faiss_path = os.path.join(db_dir, "faces.index")
+        self.clip_ann_path = os.path.join(db_dir, "vectors_ann.index")
         
         # Dimensions
         self.clip_dim = 768
         self.face_dim = 512
         
+        # Per-thread persistent connections (see get_conn)
+        self._local = threading.local()
+        
         self._init_sqlite()
         self._migrate_schema()
         self._init_faiss()
 
+        # GPU search mirror of the CLIP index (the CPU index stays canonical for persistence).
+        # StandardGpuResources is allocated once; it is expensive to create per call.
+        self.gpu_res = None
+        self._gpu_clip_index = None
+        if Config.USE_GPU_FAISS and hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0:
+            self.gpu_res = faiss.StandardGpuResources()
+
+    def get_conn(self) -> sqlite3.Connection:
+        """
+        Return this thread's persistent connection, opening it on first use.
+        Autocommit mode; rows come back as sqlite3.Row. Callers must not close it.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def files_version(self) -> int:
+        """Counter bumped by trigger on every write to files (any process/connection)."""
+        row = self.get_conn().execute("SELECT value FROM db_meta WHERE key = 'files_version'").fetchone()
+        return row[0] if row else 0
+
+    def get_filter_names(self) -> Dict[str, List[str]]:
+        """Characters and series currently in use, from the trigger-maintained count tables."""
+        conn = self.get_conn()
+        return {
+            key: [r[0] for r in conn.execute(f"SELECT name FROM {counts} WHERE count > 0 ORDER BY name COLLATE NOCASE")]
+            for key, counts in (('characters', 'character_counts'), ('series', 'series_counts'))
+        }
+
     def _migrate_schema(self):
         """Add missing columns to existing database if needed."""
         conn = sqlite3.connect(self.sqlite_path)
@@ -54,6 +112,75 @@ class DBManager:
         if 'frame_descriptions' not in columns:
             print("Migrating DB: Adding frame_descriptions column")
             c.execute("ALTER TABLE files ADD COLUMN frame_descriptions TEXT")
+
+        # Add dhash if missing
+        if 'dhash' not in columns:
+            print("Migrating DB: Adding dhash column")
+            c.execute("ALTER TABLE files ADD COLUMN dhash INTEGER")
+
+        # Add file_mtime_ns if missing
+        if 'file_mtime_ns' not in columns:
+            print("Migrating DB: Adding file_mtime_ns column")
+            c.execute("ALTER TABLE files ADD COLUMN file_mtime_ns INTEGER")
+
+        # Backfill normalized label tables from the JSON columns (schema v1)
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] < 1:
+            print("Migrating DB: Backfilling tag/character/series tables")
+            if HAS_JSON1:
+                # Explode the JSON arrays inside SQLite; malformed values count as empty
+                for (table, col), src in zip(LABEL_TABLES, ('tags', 'character_tags', 'series_tags')):
+                    c.execute(f"""
+                        INSERT OR IGNORE INTO {table} (file_id, {col})
+                        SELECT f.id, j.value
+                        FROM files f, json_each(CASE WHEN json_valid(f.{src}) THEN f.{src} ELSE '[]' END) j
+                        WHERE j.type = 'text'
+                    """)
+            else:
+                c.execute("SELECT id, tags, character_tags, series_tags FROM files")
+                for file_id, *raw_lists in c.fetchall():
+                    labels = []
+                    for raw in raw_lists:
+                        try:
+                            labels.append(json.loads(raw) if raw else [])
+                        except (TypeError, ValueError):
+                            labels.append([])
+                    self._sync_labels(c, file_id, *labels)
+            c.execute("PRAGMA user_version = 1")
+
+        # Backfill the transcript full-text index (schema v2)
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] < 2:
+            print("Migrating DB: Building transcript full-text index")
+            c.execute("""
+                SELECT id, audio_transcription, frame_descriptions FROM files
+                WHERE media_type = 'video' AND (audio_transcription IS NOT NULL OR frame_descriptions IS NOT NULL)
+            """)
+            for file_id, audio_raw, frames_raw in c.fetchall():
+                try:
+                    audio = json.loads(audio_raw) if audio_raw else []
+                    frames = json.loads(frames_raw) if frames_raw else []
+                except (TypeError, ValueError):
+                    continue
+                self._sync_fts(c, file_id, audio, frames)
+            c.execute("PRAGMA user_version = 2")
+
+        # Rebuild filter counts from the label tables (schema v3)
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] < 3:
+            print("Migrating DB: Building character/series count tables")
+            for table, counts in (('file_characters', 'character_counts'), ('file_series', 'series_counts')):
+                c.execute(f'DELETE FROM {counts}')
+                c.execute(f'INSERT INTO {counts} (name, count) SELECT name, COUNT(*) FROM {table} GROUP BY name')
+            c.execute("PRAGMA user_version = 3")
+
+        # dHash moved from hex text to INTEGER (schema v4); old values are dropped
+        # and recomputed by the deduplicator on demand
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] < 4:
+            print("Migrating DB: Clearing hex dHash values")
+            c.execute("UPDATE files SET dhash = NULL WHERE typeof(dhash) = 'text'")
+            c.execute("PRAGMA user_version = 4")
             
         conn.commit()
         conn.close()
@@ -83,7 +210,9 @@ class DBManager:
                 series_tags TEXT, -- JSON List
                 rating INTEGER DEFAULT 0,
                 audio_transcription TEXT, -- JSON List
-                frame_descriptions TEXT -- JSON List
+                frame_descriptions TEXT, -- JSON List
+                dhash INTEGER, -- 64-bit dHash as signed int64 (images)
+                file_mtime_ns INTEGER -- st_mtime_ns when file_hash was computed
             )
         ''')
         
@@ -98,10 +227,103 @@ class DBManager:
                 FOREIGN KEY(file_id) REFERENCES files(id)
             )
         ''')
+
+        # Normalized label tables (indexed lookups instead of LIKE on JSON)
+        for table, col in LABEL_TABLES:
+            c.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    file_id INTEGER NOT NULL,
+                    {col} TEXT NOT NULL,
+                    PRIMARY KEY (file_id, {col}),
+                    FOREIGN KEY(file_id) REFERENCES files(id)
+                ) WITHOUT ROWID
+            ''')
+            c.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table}({col}, file_id)')
+
+        # Per-name usage counts for the filter dropdowns, maintained by triggers
+        for table, counts in (('file_characters', 'character_counts'), ('file_series', 'series_counts')):
+            c.execute(f'CREATE TABLE IF NOT EXISTS {counts} (name TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0)')
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {counts} (name, count) VALUES (NEW.name, 1)
+                    ON CONFLICT(name) DO UPDATE SET count = count + 1;
+                END
+            ''')
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {table} BEGIN
+                    UPDATE {counts} SET count = count - 1 WHERE name = OLD.name;
+                END
+            ''')
+
+        # Monotonic version bumped on every write to files (used as a cache key)
+        c.execute('CREATE TABLE IF NOT EXISTS db_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        c.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('files_version', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_files_version_{event.lower()} AFTER {event} ON files BEGIN
+                    UPDATE db_meta SET value = value + 1 WHERE key = 'files_version';
+                END
+            ''')
+
+        # Full-text index over video transcripts/frame descriptions (rowid = files.id).
+        # Trigram keeps substring semantics (incl. CJK text); fall back for old SQLite.
+        try:
+            c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(audio_text, frame_text, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(audio_text, frame_text, tokenize='unicode61 remove_diacritics 2')")
+        c.execute("SELECT sql FROM sqlite_master WHERE name = 'files_fts'")
+        self.fts_trigram = 'trigram' in c.fetchone()[0]
         
         conn.commit()
         conn.close()
 
+    def _sync_labels(self, c: sqlite3.Cursor, file_id: int, tags: List[str], character_tags: List[str], series_tags: List[str]):
+        """Mirror a file's tag lists into the normalized label tables."""
+        for (table, col), values in zip(LABEL_TABLES, (tags, character_tags, series_tags)):
+            c.execute(f'DELETE FROM {table} WHERE file_id = ?', (file_id,))
+            if values:
+                c.executemany(
+                    f'INSERT OR IGNORE INTO {table} (file_id, {col}) VALUES (?, ?)',
+                    [(file_id, v) for v in values]
+                )
+
+    def _sync_fts(self, c: sqlite3.Cursor, file_id: int, audio_transcription: Optional[List[Dict]], frame_descriptions: Optional[List[Dict]]):
+        """Flatten a video's transcript/frame segments into the full-text index."""
+        c.execute('DELETE FROM files_fts WHERE rowid = ?', (file_id,))
+        audio_text = "\n".join(f"[Audio @{seg['start']:.1f}s] {seg['text']}" for seg in audio_transcription or [])
+        frame_text = "\n".join(f"[Video @{seg['timestamp']:.1f}s] {seg['text']}" for seg in frame_descriptions or [])
+        if audio_text or frame_text:
+            c.execute('INSERT INTO files_fts (rowid, audio_text, frame_text) VALUES (?, ?, ?)', (file_id, audio_text, frame_text))
+
+    def search_transcripts(self, query: str, limit: int = 20, file_ids: Optional[List[int]] = None) -> List[Tuple[int, str]]:
+        """
+        Full-text search over video transcripts and frame descriptions.
+        Returns [(file_id, snippet), ...] ordered by relevance.
+        """
+        if len(query) < FTS_MIN_QUERY_LEN and self.fts_trigram:
+            # Too short for the trigram index; plain substring scan over the FTS text
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where = "(audio_text LIKE ? ESCAPE '\\' OR frame_text LIKE ? ESCAPE '\\')"
+            params = [f"%{escaped}%", f"%{escaped}%"]
+            order = ""
+        else:
+            # Quote as a single phrase so user input is never parsed as FTS syntax
+            where = "files_fts MATCH ?"
+            params = ['"' + query.replace('"', '""') + '"']
+            order = "ORDER BY rank"
+
+        if file_ids is not None:
+            if not file_ids:
+                return []
+            where += f" AND rowid IN ({','.join(['?'] * len(file_ids))})"
+            params.extend(file_ids)
+
+        rows = self.get_conn().execute(f"""
+            SELECT rowid, snippet(files_fts, -1, '', '', '...', 32)
+            FROM files_fts WHERE {where} {order} LIMIT ?
+        """, params + [limit]).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
     def _init_faiss(self):
         """Initialize FAISS indices."""
         # 1. CLIP Index (Inner Product for Cosine Similarity - vectors must be normalized)
@@ -112,6 +334,13 @@ class DBManager:
             # Use IDMap to map vector IDs to File IDs
             self.clip_index = faiss.IndexIDMap(self.clip_index)
 
+        # 1b. Optional ANN index over the same CLIP vectors (see build_clip_ann)
+        self.clip_ann = None
+        self._clip_offsets = None
+        if os.path.exists(self.clip_ann_path):
+            self.clip_ann = faiss.read_index(self.clip_ann_path)
+            faiss.extract_index_ivf(self.clip_ann).nprobe = Config.CLIP_ANN_NPROBE
+
         # 2. Face Index
         if os.path.exists(self.face_faiss_path):
             self.face_index = faiss.read_index(self.face_faiss_path)
@@ -119,18 +348,83 @@ class DBManager:
             self.face_index = faiss.IndexFlatIP(self.face_dim)
             self.face_index = faiss.IndexIDMap(self.face_index)
 
+    def _clip_search_index(self):
+        """Return the index to search: the GPU mirror if available, else the CPU index."""
+        if self.gpu_res is None:
+            return self.clip_index
+        if self._gpu_clip_index is None or self._gpu_clip_index.ntotal != self.clip_index.ntotal:
+            try:
+                self._gpu_clip_index = faiss.index_cpu_to_gpu(self.gpu_res, 0, self.clip_index)
+            except Exception as e:
+                print(f"GPU FAISS unavailable, searching on CPU: {e}")
+                self.gpu_res = None
+                self._gpu_clip_index = None
+                return self.clip_index
+        return self._gpu_clip_index
+
+    def _add_clip_vectors(self, vecs: np.ndarray, ids: np.ndarray):
+        """Add normalized CLIP vectors to the index (and its GPU mirror / ANN index if built)."""
+        start = self.clip_index.ntotal
+        self.clip_index.add_with_ids(vecs, ids)
+        if self._gpu_clip_index is not None:
+            self._gpu_clip_index.add_with_ids(vecs, ids)
+        if self.clip_ann is not None:
+            self.clip_ann.add_with_ids(vecs, ids)
+        if self._clip_offsets is not None:
+            for i, fid in enumerate(ids):
+                self._clip_offsets[int(fid)] = start + i
+
+    def _clip_id_offsets(self) -> Dict[int, int]:
+        """file_id -> row in the flat CLIP index (latest vector wins for re-processed files)."""
+        if self._clip_offsets is None:
+            ids = faiss.vector_to_array(self.clip_index.id_map)
+            self._clip_offsets = {int(fid): off for off, fid in enumerate(ids)}
+        return self._clip_offsets
+
+    def build_clip_ann(self, min_vectors: Optional[int] = None) -> bool:
+        """
+        Train and persist the IVF-PQ fast-scan index over all CLIP vectors.
+        Skipped (returns False) while the library is smaller than min_vectors.
+        """
+        n = self.clip_index.ntotal
+        if n < (min_vectors if min_vectors is not None else Config.CLIP_ANN_MIN_VECTORS):
+            return False
+
+        print(f"Building CLIP ANN index ({Config.CLIP_ANN_FACTORY}) over {n} vectors...")
+        vecs = self.clip_index.index.reconstruct_n(0, n)
+        ids = faiss.vector_to_array(self.clip_index.id_map)
+        ann = faiss.index_factory(self.clip_dim, Config.CLIP_ANN_FACTORY, faiss.METRIC_INNER_PRODUCT)
+        ann.train(vecs)
+        ann.add_with_ids(vecs, ids)
+        faiss.extract_index_ivf(ann).nprobe = Config.CLIP_ANN_NPROBE
+
+        self.clip_ann = ann
+        faiss.write_index(ann, self.clip_ann_path)
+        return True
+
+    def _search_clip_ann(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ANN candidate search, re-ranked with exact scores from the flat index."""
+        _, cand = self.clip_ann.search(query, top_k * Config.CLIP_ANN_RERANK)
+        offsets = self._clip_id_offsets()
+        ids = [fid for fid in dict.fromkeys(int(i) for i in cand[0] if i != -1) if fid in offsets]
+        if not ids:
+            return np.empty((1, 0), dtype='float32'), np.empty((1, 0), dtype='int64')
+
+        vecs = self.clip_index.index.reconstruct_batch(np.array([offsets[fid] for fid in ids], dtype='int64'))
+        scores = vecs @ query[0]
+        order = np.argsort(-scores)[:top_k]
+        return scores[order][None], np.array(ids, dtype='int64')[order][None]
+
     def save_indices(self):
         """Persist FAISS indices to disk."""
         faiss.write_index(self.clip_index, self.faiss_path)
         faiss.write_index(self.face_index, self.face_faiss_path)
+        if self.clip_ann is not None:
+            faiss.write_index(self.clip_ann, self.clip_ann_path)
 
     def is_file_processed(self, file_path: str, file_hash: str) -> bool:
         """Check if file exists and hash matches."""
-        conn = sqlite3.connect(self.sqlite_path)
-        c = conn.cursor()
-        c.execute('SELECT file_hash, is_processed FROM files WHERE file_path = ?', (file_path,))
-        row = c.fetchone()
-        conn.close()
+        row = self.get_conn().execute('SELECT file_hash, is_processed FROM files WHERE file_path = ?', (file_path,)).fetchone()
         
         if row:
             stored_hash, is_processed = row
@@ -138,50 +432,115 @@ class DBManager:
                 return True
         return False
 
-    def add_result(self, result: ProcessingResult):
-        """Add processing result to DB and Indices."""
+    def filter_unprocessed(self, pairs: List[Tuple[str, str]]) -> Set[str]:
+        """
+        is_file_processed for many (file_path, file_hash) pairs: returns the paths that
+        still need processing, with one indexed IN query per chunk instead of one per file.
+        """
+        stored = {}
+        paths = [p for p, _ in pairs]
+        conn = self.get_conn()
+        for start in range(0, len(paths), 500):  # stay under SQLITE_MAX_VARIABLE_NUMBER
+            chunk = paths[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for path, file_hash, is_processed in conn.execute(
+                    f'SELECT file_path, file_hash, is_processed FROM files WHERE file_path IN ({placeholders})', chunk):
+                stored[path] = (file_hash, is_processed)
+        return {p for p, h in pairs if stored.get(p, (None, 0)) != (h, 1)}
+
+    def get_cached_hashes(self, stats: Dict[str, Tuple[int, int]]) -> Dict[str, str]:
+        """
+        Stored file_hash for each path whose (file_size, file_mtime_ns) still matches
+        `stats`, so unchanged files can skip reading their contents. Chunked like filter_unprocessed.
+        """
+        cached = {}
+        paths = list(stats)
+        conn = self.get_conn()
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for path, file_hash, size, mtime_ns in conn.execute(
+                    f'SELECT file_path, file_hash, file_size, file_mtime_ns FROM files WHERE file_path IN ({placeholders})', chunk):
+                if mtime_ns is not None and stats[path] == (size, mtime_ns):
+                    cached[path] = file_hash
+        return cached
+
+    def get_unstamped_hashes(self, paths: List[str]) -> Dict[str, str]:
+        """Stored file_hash for each of `paths` whose row predates file_mtime_ns (no stat recorded)."""
+        found = {}
+        conn = self.get_conn()
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for path, file_hash in conn.execute(
+                    f'SELECT file_path, file_hash FROM files WHERE file_mtime_ns IS NULL AND file_path IN ({placeholders})', chunk):
+                found[path] = file_hash
+        return found
+
+    def stamp_file_stats(self, stats: List[Tuple[str, int, int]]):
+        """Record (file_path, file_size, file_mtime_ns) on rows whose stored hash was just verified."""
+        conn = self.get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany('UPDATE files SET file_size = ?, file_mtime_ns = ? WHERE file_path = ?',
+                             [(size, mtime_ns, path) for path, size, mtime_ns in stats])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_result(self, result: ProcessingResult) -> int:
+        """Add processing result to DB and Indices. Returns the file's row id."""
         item = result.media_item
         vec_data = result.vector_data
         
-        conn = sqlite3.connect(self.sqlite_path)
+        conn = self.get_conn()
         c = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE")
         
         try:
             # Upsert File Info
             # SQLite upsert syntax (ON CONFLICT)
             c.execute('''
-                INSERT INTO files (file_path, file_hash, file_size, media_type, created_at, modified_at, width, height, duration, is_processed, error_msg, tags, character_tags, series_tags, audio_transcription, frame_descriptions)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO files (file_path, file_hash, file_size, media_type, created_at, modified_at, width, height, duration, is_processed, error_msg, tags, character_tags, series_tags, audio_transcription, frame_descriptions, dhash, file_mtime_ns)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(file_path) DO UPDATE SET
                     file_hash=excluded.file_hash,
                     is_processed=excluded.is_processed,
                     error_msg=excluded.error_msg,
+                    file_size=excluded.file_size,
                     modified_at=excluded.modified_at,
+                    file_mtime_ns=excluded.file_mtime_ns,
                     tags=excluded.tags,
                     character_tags=excluded.character_tags,
                     series_tags=excluded.series_tags,
                     audio_transcription=excluded.audio_transcription,
-                    frame_descriptions=excluded.frame_descriptions
+                    frame_descriptions=excluded.frame_descriptions,
+                    dhash=excluded.dhash
             ''', (
                 item.file_path, item.file_hash, item.file_size, item.media_type, 
                 item.created_at, item.modified_at, item.width, item.height, item.duration,
                 1 if result.success else 0, item.error_msg, 
                 json.dumps(item.tags), json.dumps(item.character_tags), json.dumps(item.series_tags),
                 json.dumps(item.audio_transcription) if item.audio_transcription is not None else None,
-                json.dumps(item.frame_descriptions) if item.frame_descriptions is not None else None
+                json.dumps(item.frame_descriptions) if item.frame_descriptions is not None else None,
+                item.dhash, item.mtime_ns
             ))
             
-            file_id = c.lastrowid
-            if not file_id:
-                 # In case of update, lastrowid might be 0, need to fetch
-                 c.execute('SELECT id FROM files WHERE file_path = ?', (item.file_path,))
-                 file_id = c.fetchone()[0]
+            # lastrowid is not usable here: after an upsert that updated, the persistent
+            # connection still reports its previous insert
+            c.execute('SELECT id FROM files WHERE file_path = ?', (item.file_path,))
+            file_id = c.fetchone()[0]
+
+            self._sync_labels(c, file_id, item.tags, item.character_tags, item.series_tags)
+            if item.media_type == 'video':
+                self._sync_fts(c, file_id, item.audio_transcription, item.frame_descriptions)
 
             if result.success and vec_data:
                 # 1. Add CLIP Vector
                 clip_vec = np.array([vec_data.clip_vector], dtype='float32') # (1, 768)
                 faiss.normalize_L2(clip_vec) # Ensure normalized
-                self.clip_index.add_with_ids(clip_vec, np.array([file_id], dtype='int64'))
+                self._add_clip_vectors(clip_vec, np.array([file_id], dtype='int64'))
                 
                 # 2. Add Face Vectors
                 if vec_data.face_vectors:
@@ -201,15 +560,14 @@ class DBManager:
                         # Add to FAISS
                         self.face_index.add_with_ids(np.array([face_vec]), np.array([face_db_id], dtype='int64'))
 
-            conn.commit()
+            conn.execute("COMMIT")
+            return file_id
             
         except Exception as e:
             print(f"DB Error: {e}")
-            conn.rollback()
+            conn.execute("ROLLBACK")
             raise e
         finally:
-            conn.close()
-
             # For performance, might not want to save index every single file, but for safety we do or batch it.
             # Here we save to be safe.
             self.save_indices()
@@ -222,7 +580,10 @@ class DBManager:
         params = np.array([query_vector], dtype='float32')
         faiss.normalize_L2(params)
         
-        D, I = self.clip_index.search(params, top_k)
+        if self.clip_ann is not None:
+            D, I = self._search_clip_ann(params, top_k)
+        else:
+            D, I = self._clip_search_index().search(params, top_k)
         
         # I[0] contains IDs (file_ids)
         file_ids = [int(idx) for idx in I[0] if idx != -1]
@@ -232,15 +593,11 @@ class DBManager:
             return []
             
         # Resolve File Paths
-        conn = sqlite3.connect(self.sqlite_path)
-        c = conn.cursor()
-        
         placeholders = ','.join(['?'] * len(file_ids))
         # Preserving order is tricky in SQL IN clause.
         # Format: (id, path)
-        c.execute(f'SELECT id, file_path FROM files WHERE id IN ({placeholders})', file_ids)
+        c = self.get_conn().execute(f'SELECT id, file_path FROM files WHERE id IN ({placeholders})', file_ids)
         rows = {row[0]: row[1] for row in c.fetchall()}
-        conn.close()
         
         results = []
         for fid, score in zip(file_ids, scores):
@@ -249,16 +606,40 @@ class DBManager:
                 
         return results
 
-    def add_results_batch(self, results: List[ProcessingResult]):
+    def set_face_clusters(self, face_ids: np.ndarray, labels: np.ndarray):
+        """
+        Write cluster labels for many faces at once: the pairs go into a temp table and
+        faces is updated by one joined statement, in one transaction.
+        """
+        conn = self.get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS face_cluster_updates (id INTEGER PRIMARY KEY, cluster_id INTEGER)")
+            conn.execute("DELETE FROM face_cluster_updates")
+            conn.executemany("INSERT OR REPLACE INTO face_cluster_updates (id, cluster_id) VALUES (?, ?)",
+                             zip(np.asarray(face_ids).tolist(), np.asarray(labels).tolist()))
+            conn.execute('''
+                UPDATE faces SET cluster_id = (SELECT u.cluster_id FROM face_cluster_updates u WHERE u.id = faces.id)
+                WHERE id IN (SELECT id FROM face_cluster_updates)
+            ''')
+            conn.execute("DELETE FROM face_cluster_updates")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_results_batch(self, results: List[ProcessingResult]) -> Dict[str, int]:
         """
         Batch insert for performance.
         Much faster than single insert loop.
+        Returns a file_path -> row id mapping for the stored results.
         """
         if not results:
-            return
+            return {}
 
-        conn = sqlite3.connect(self.sqlite_path)
+        conn = self.get_conn()
         c = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE")
         
         try:
             # 1. Upsert files in batch
@@ -273,22 +654,26 @@ class DBManager:
                    1 if r.success else 0, item.error_msg, 
                    json.dumps(item.tags), json.dumps(item.character_tags), json.dumps(item.series_tags),
                    json.dumps(item.audio_transcription) if item.audio_transcription is not None else None,
-                   json.dumps(item.frame_descriptions) if item.frame_descriptions is not None else None
+                   json.dumps(item.frame_descriptions) if item.frame_descriptions is not None else None,
+                   item.dhash, item.mtime_ns
                 ))
             
             c.executemany('''
-                INSERT INTO files (file_path, file_hash, file_size, media_type, created_at, modified_at, width, height, duration, is_processed, error_msg, tags, character_tags, series_tags, audio_transcription, frame_descriptions)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO files (file_path, file_hash, file_size, media_type, created_at, modified_at, width, height, duration, is_processed, error_msg, tags, character_tags, series_tags, audio_transcription, frame_descriptions, dhash, file_mtime_ns)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(file_path) DO UPDATE SET
                     file_hash=excluded.file_hash,
                     is_processed=excluded.is_processed,
                     error_msg=excluded.error_msg,
+                    file_size=excluded.file_size,
                     modified_at=excluded.modified_at,
+                    file_mtime_ns=excluded.file_mtime_ns,
                     tags=excluded.tags,
                     character_tags=excluded.character_tags,
                     series_tags=excluded.series_tags,
                     audio_transcription=excluded.audio_transcription,
-                    frame_descriptions=excluded.frame_descriptions
+                    frame_descriptions=excluded.frame_descriptions,
+                    dhash=excluded.dhash
             ''', files_data)
             
             # Need to get IDs Back. 
@@ -299,6 +684,14 @@ class DBManager:
             placeholders = ','.join(['?'] * len(paths))
             c.execute(f"SELECT file_path, id FROM files WHERE file_path IN ({placeholders})", paths)
             path_to_id = {row[0]: row[1] for row in c.fetchall()}
+
+            for r in results:
+                fid = path_to_id.get(r.media_item.file_path)
+                if fid is not None:
+                    item = r.media_item
+                    self._sync_labels(c, fid, item.tags, item.character_tags, item.series_tags)
+                    if item.media_type == 'video':
+                        self._sync_fts(c, fid, item.audio_transcription, item.frame_descriptions)
             
             # 2. Prepare Vectors
             clip_vectors_list = []
@@ -334,7 +727,7 @@ class DBManager:
                 vecs = np.array(clip_vectors_list, dtype='float32')
                 ids = np.array(clip_ids_list, dtype='int64')
                 faiss.normalize_L2(vecs)
-                self.clip_index.add_with_ids(vecs, ids)
+                self._add_clip_vectors(vecs, ids)
             
             # B. Face Metadata (SQLite) (One by one loop for safety to get IDs) & Face FAISS
             if face_vectors_list:
@@ -353,12 +746,11 @@ class DBManager:
                     faiss.normalize_L2(f_vecs)
                     self.face_index.add_with_ids(f_vecs, f_ids)
 
-            conn.commit()
+            conn.execute("COMMIT")
             self.save_indices()
+            return path_to_id
             
         except Exception as e:
             print(f"Batch Insert Error: {e}")
-            conn.rollback()
+            conn.execute("ROLLBACK")
             raise e
-        finally:
-            conn.close()
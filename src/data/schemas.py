@@ -1,8 +1,9 @@
 
 from dataclasses import dataclass, field, asdict
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Union
 import datetime
 import json
+import numpy as np
 
 @dataclass
 class MediaItem:
@@ -26,6 +27,8 @@ class MediaItem:
     error_msg: Optional[str] = None
     audio_transcription: Optional[List[Dict[str, Any]]] = None
     frame_descriptions: Optional[List[Dict[str, Any]]] = None
+    dhash: Optional[int] = None # Structural hash for dedup (images, 64-bit signed), computed at scan
+    mtime_ns: Optional[int] = None # st_mtime_ns at scan; with file_size, keys the stored file_hash
     
     def to_dict(self):
         return asdict(self)
@@ -33,13 +36,13 @@ class MediaItem:
 @dataclass
 class VectorData:
     """Stores vector embeddings."""
-    clip_vector: List[float] # 768 dim
-    face_vectors: List[List[float]] # List of 512 dim vectors (multiple faces)
+    clip_vector: Union[List[float], np.ndarray] # 768 dim
+    face_vectors: List[Union[List[float], np.ndarray]] # List of 512 dim vectors (multiple faces)
     
     def to_json(self):
         return json.dumps({
-            'clip_vector': self.clip_vector,
-            'face_vectors': self.face_vectors
+            'clip_vector': np.asarray(self.clip_vector, dtype=np.float32).tolist(),
+            'face_vectors': [np.asarray(v, dtype=np.float32).tolist() for v in self.face_vectors]
         })
     
     @staticmethod
@@ -53,7 +56,7 @@ class VectorData:
 @dataclass
 class FaceData:
     """Detailed face info for clustering (not just vector)."""
-    embedding: List[float] # 512
+    embedding: Union[List[float], np.ndarray] # 512; a float32 row view of FaceBatch.embeddings
     bbox: List[int]
     det_score: float
     kps: Optional[List[List[int]]] = None
@@ -62,6 +65,25 @@ class FaceData:
     def to_dict(self):
         return asdict(self)
 
+@dataclass
+class FaceBatch:
+    """
+    Faces detected in one image as parallel arrays (row i is face i).
+    Embeddings can go straight to FAISS/clustering without re-stacking.
+    """
+    bboxes: np.ndarray      # (N, 4) int32
+    kps: np.ndarray         # (N, 5, 2) int32
+    scores: np.ndarray      # (N,) float32
+    embeddings: np.ndarray  # (N, 512) float32
+
+    def __len__(self):
+        return len(self.scores)
+
+    @classmethod
+    def empty(cls, dim: int = 512):
+        return cls(np.empty((0, 4), np.int32), np.empty((0, 5, 2), np.int32),
+                   np.empty(0, np.float32), np.empty((0, dim), np.float32))
+
 @dataclass
 class ProcessingResult:
     """Result returned from Processor."""
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from server import chat_queue
+
+
+class _FakeVLM:
+    def ask_image_batch(self, images, prompts):
+        return [f"answer: {p}" for p in prompts]
+
+    def unload(self):
+        pass
+
+
+def test_submit_from_worker_thread():
+    print("=== Testing Chat Queue Submit From A Thread ===")
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "img.jpg")
+        Image.new("RGB", (8, 8)).save(path)
+
+        async def scenario():
+            worker = asyncio.create_task(chat_queue.run_worker(_FakeVLM))
+            while chat_queue._queue is None:
+                await asyncio.sleep(0)
+
+            # Like a sync FastAPI route: submit runs in a threadpool thread
+            job_ids = []
+
+            def route():
+                time.sleep(0.2)  # let the loop go idle in select() first
+                job_ids.append(chat_queue.submit(path, "what is this?"))
+
+            t = threading.Thread(target=route)
+            t.start()
+
+            # Nothing else wakes the loop before this sleep ends: the put itself must
+            # wake the worker (well before IDLE_UNLOAD_SECONDS)
+            await asyncio.sleep(1.0)
+            t.join()
+            assert chat_queue.get_job(job_ids[0])["status"] != "pending", "job was not picked up"
+
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+            return chat_queue.get_job(job_ids[0])
+
+        job = asyncio.run(scenario())
+        assert job == {"status": "done", "answer": "answer: what is this?"}
+        assert chat_queue._queue is None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print("Chat Queue Test Passed!")
+
+
+if __name__ == "__main__":
+    test_submit_from_worker_thread()
@@ -0,0 +1,261 @@
+import os
+import json
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+
+from src.data.db_manager import DBManager
+from src.data.schemas import MediaItem, ProcessingResult, VectorData
+
+
+def _make_result(path, tags, chars, series, media_type="image"):
+    item = MediaItem(path, f"hash_{path}", 100, media_type, 1000, 1000, 64, 64,
+                     tags=tags, character_tags=chars, series_tags=series)
+    vec = np.random.randn(768).astype(np.float32)
+    return ProcessingResult(path, True, item, VectorData(clip_vector=vec.tolist(), face_vectors=[]))
+
+
+def test_label_tables():
+    print("=== Testing Normalized Label Tables ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        db.add_results_batch([
+            _make_result("a.jpg", ["portrait"], ["rem"], ["re:zero"]),
+            _make_result("b.jpg", ["landscape"], ["ram", "rem"], ["re:zero"]),
+            _make_result("c.jpg", ["portrait"], ["remilia"], ["touhou"]),
+        ])
+
+        conn = sqlite3.connect(db.sqlite_path)
+        c = conn.cursor()
+        c.execute("""
+            SELECT file_path FROM files
+            WHERE EXISTS (SELECT 1 FROM file_characters WHERE name = ? AND file_id = files.id)
+            ORDER BY file_path
+        """, ("rem",))
+        # 'remilia' must not match 'rem' (the old LIKE filter could)
+        assert [r[0] for r in c.fetchall()] == ["a.jpg", "b.jpg"]
+
+        # Re-processing a file replaces its labels
+        db.add_result(_make_result("b.jpg", ["landscape"], ["ram"], []))
+        c.execute("SELECT name FROM file_characters f JOIN files ON files.id = f.file_id WHERE file_path = 'b.jpg'")
+        assert [r[0] for r in c.fetchall()] == ["ram"]
+        c.execute("SELECT COUNT(*) FROM file_series f JOIN files ON files.id = f.file_id WHERE file_path = 'b.jpg'")
+        assert c.fetchone()[0] == 0
+        conn.close()
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Label Table Test Passed!")
+
+
+def test_label_backfill():
+    print("=== Testing Label Backfill Migration ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        # Simulate a pre-migration database
+        conn = sqlite3.connect(os.path.join(db_dir, "metadata.db"))
+        conn.execute("CREATE TABLE files (id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT UNIQUE, file_hash TEXT, file_size INTEGER, media_type TEXT, created_at REAL, modified_at REAL, width INTEGER, height INTEGER, duration REAL, is_processed BOOLEAN DEFAULT 0, error_msg TEXT, tags TEXT, rating INTEGER DEFAULT 0)")
+        conn.execute("INSERT INTO files (file_path, is_processed, tags) VALUES (?, 1, ?)", ("old.jpg", json.dumps(["sky", "sunset"])))
+        conn.execute("INSERT INTO files (file_path, is_processed, tags) VALUES (?, 1, ?)", ("bad.jpg", "not json"))
+        conn.commit()
+        conn.close()
+
+        db = DBManager(db_dir)
+        conn = sqlite3.connect(db.sqlite_path)
+        tags = sorted(r[0] for r in conn.execute("SELECT tag FROM file_tags"))
+        conn.close()
+        assert tags == ["sky", "sunset"]
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Label Backfill Test Passed!")
+
+
+def test_dhash_column():
+    print("=== Testing Stored dHash ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        res = _make_result("a.jpg", [], [], [])
+        res.media_item.dhash = -0x0f0f0f0f0f0f0f10 # high bit set
+        db.add_results_batch([res])
+        row = db.get_conn().execute("SELECT dhash FROM files WHERE file_path = 'a.jpg'").fetchone()
+        assert row[0] == -0x0f0f0f0f0f0f0f10
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Stored dHash Test Passed!")
+
+
+def test_add_result_ids():
+    print("=== Testing Row Ids From add_result ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        first = db.add_result(_make_result("a.jpg", [], [], []))
+        second = db.add_result(_make_result("b.jpg", [], [], []))
+        # Re-adding a stored file updates it and must return its own id, not the last insert's
+        assert db.add_result(_make_result("a.jpg", ["portrait"], [], [])) == first != second
+        assert db.add_results_batch([_make_result("b.jpg", [], [], [])]) == {"b.jpg": second}
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Row Id Test Passed!")
+
+
+def test_transcript_search():
+    print("=== Testing Transcript Full-Text Search ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        vid = _make_result("clip.mp4", [], [], [], media_type="video")
+        vid.media_item.audio_transcription = [{'start': 12.0, 'end': 14.0, 'text': 'The red umbrella is open'}]
+        vid.media_item.frame_descriptions = [{'timestamp': 3.0, 'text': '雨の中で傘を持つ女の子'}]
+        db.add_results_batch([vid, _make_result("still.jpg", [], [], [])])
+
+        hits = db.search_transcripts("umbrella")
+        assert len(hits) == 1
+        assert "[Audio @12.0s]" in hits[0][1] and "umbrella" in hits[0][1]
+
+        # Substring match inside unsegmented Japanese text
+        assert len(db.search_transcripts("傘を持つ")) == 1
+        # Short queries fall back to a substring scan
+        assert len(db.search_transcripts("傘")) == 1
+        # FTS syntax in user input is treated literally
+        assert db.search_transcripts('umbrella" OR "x') == []
+        assert db.search_transcripts("umbrella", file_ids=[]) == []
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Transcript Search Test Passed!")
+
+
+def test_filter_counts():
+    print("=== Testing Filter Count Tables ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        v0 = db.files_version
+        db.add_results_batch([
+            _make_result("a.jpg", [], ["Rem"], ["re:zero"]),
+            _make_result("b.jpg", [], ["ram", "Rem"], ["re:zero"]),
+        ])
+        assert db.files_version > v0
+        assert db.get_filter_names() == {"characters": ["ram", "Rem"], "series": ["re:zero"]}
+
+        # Names drop out once no file carries them
+        v1 = db.files_version
+        db.add_result(_make_result("b.jpg", [], ["Rem"], []))
+        db.add_result(_make_result("a.jpg", [], ["Rem"], []))
+        assert db.files_version > v1
+        assert db.get_filter_names() == {"characters": ["Rem"], "series": []}
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Filter Count Test Passed!")
+
+
+def test_clip_ann():
+    print("=== Testing CLIP ANN Index ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        results = [_make_result(f"{i}.jpg", [], [], []) for i in range(3000)]
+        db.add_results_batch(results)
+        assert not db.build_clip_ann()  # below Config.CLIP_ANN_MIN_VECTORS
+        assert db.build_clip_ann(min_vectors=1000)
+
+        # Exact re-ranking: the query's own vector comes back first with its true score
+        query = np.array(results[42].vector_data.clip_vector, dtype=np.float32)
+        hits = db.search_similar_images(query, top_k=5)
+        assert hits[0][0] == "42.jpg" and abs(hits[0][1] - 1.0) < 1e-4
+
+        # Persisted and reloaded; new vectors are searchable without a rebuild
+        db.add_result(_make_result("new.jpg", [], [], []))
+        db = DBManager(db_dir)
+        assert db.clip_ann is not None
+        row = db.get_conn().execute("SELECT id FROM files WHERE file_path = 'new.jpg'").fetchone()
+        vec = db.clip_index.index.reconstruct(db._clip_id_offsets()[row[0]])
+        assert db.search_similar_images(vec, top_k=1)[0][0] == "new.jpg"
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("CLIP ANN Test Passed!")
+
+
+def test_face_clusters():
+    print("=== Testing Bulk Face Cluster Update ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        conn = db.get_conn()
+        conn.executemany("INSERT INTO faces (file_id, face_index, timestamp) VALUES (1, ?, 0.0)", [(i,) for i in range(5)])
+        ids = np.array([r[0] for r in conn.execute("SELECT id FROM faces ORDER BY id")], dtype=np.int64)
+
+        db.set_face_clusters(ids[:4], np.array([0, 0, 1, -1]))
+        rows = conn.execute("SELECT cluster_id FROM faces ORDER BY id").fetchall()
+        assert [r[0] for r in rows] == [0, 0, 1, -1, -1]  # last face untouched (default -1)
+
+        db.set_face_clusters(ids[:1], np.array([7]))
+        assert conn.execute("SELECT cluster_id FROM faces WHERE id = ?", (int(ids[1]),)).fetchone()[0] == 0
+        assert conn.execute("SELECT cluster_id FROM faces WHERE id = ?", (int(ids[0]),)).fetchone()[0] == 7
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Bulk Face Cluster Test Passed!")
+
+
+def test_filter_unprocessed():
+    print("=== Testing Bulk Processed Check ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        failed = _make_result("failed.jpg", [], [], [])
+        failed.success = False
+        db.add_results_batch([_make_result("done.jpg", [], [], []), failed])
+
+        pairs = [("done.jpg", "hash_done.jpg"), ("changed.jpg", "x"), ("failed.jpg", "hash_failed.jpg"), ("new.jpg", "h")]
+        db.add_results_batch([_make_result("changed.jpg", [], [], [])])
+        todo = db.filter_unprocessed(pairs)
+        assert todo == {"changed.jpg", "failed.jpg", "new.jpg"}
+        assert todo == {p for p, h in pairs if not db.is_file_processed(p, h)}
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Bulk Processed Check Test Passed!")
+
+
+def test_cached_hashes():
+    print("=== Testing Stat Hash Cache ===")
+    db_dir = tempfile.mkdtemp()
+    try:
+        db = DBManager(db_dir)
+        results = [_make_result(p, [], [], []) for p in ("same.jpg", "touched.jpg", "legacy.jpg")]
+        results[0].media_item.mtime_ns = 5
+        results[1].media_item.mtime_ns = 5
+        db.add_results_batch(results)
+
+        cached = db.get_cached_hashes({"same.jpg": (100, 5), "touched.jpg": (100, 6),
+                                       "legacy.jpg": (100, 5), "new.jpg": (100, 5)})
+        # Rows written before the column existed never match
+        assert cached == {"same.jpg": "hash_same.jpg"}
+
+        # Re-processing a changed file stores its new stat
+        results[1].media_item.file_size, results[1].media_item.mtime_ns = 200, 6
+        db.add_result(results[1])
+        assert db.get_cached_hashes({"touched.jpg": (200, 6)}) == {"touched.jpg": "hash_touched.jpg"}
+
+        # Pre-stat rows are found by path, and stamping them enables the fast path
+        assert db.get_unstamped_hashes(["same.jpg", "legacy.jpg", "new.jpg"]) == {"legacy.jpg": "hash_legacy.jpg"}
+        db.stamp_file_stats([("legacy.jpg", 300, 7)])
+        assert db.get_unstamped_hashes(["legacy.jpg"]) == {}
+        assert db.get_cached_hashes({"legacy.jpg": (300, 7)}) == {"legacy.jpg": "hash_legacy.jpg"}
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("Stat Hash Cache Test Passed!")
+
+
+if __name__ == "__main__":
+    test_label_tables()
+    test_label_backfill()
+    test_dhash_column()
+    test_add_result_ids()
+    test_transcript_search()
+    test_filter_counts()
+    test_clip_ann()
+    test_face_clusters()
+    test_filter_unprocessed()
+    test_cached_hashes()
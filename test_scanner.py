@@ -0,0 +1,56 @@
+import os
+import queue
+import shutil
+import tempfile
+import time
+import types
+
+import src.core.scanner as scanner_module
+from src.core.scanner import Scanner
+
+
+class _SlowFilesQueue(queue.SimpleQueue):
+    """Delays handing over the file list of directory 'a' (the walker's out queue)."""
+
+    def put(self, item, *args, **kwargs):
+        if isinstance(item, list) and any(os.path.basename(os.path.dirname(e.path)) == "a" for e in item):
+            time.sleep(0.3)
+        super().put(item, *args, **kwargs)
+
+
+def test_parallel_scan_slow_directory():
+    print("=== Testing Parallel Scan With A Slow Directory ===")
+    root = tempfile.mkdtemp()
+    try:
+        for rel in ("a/1.jpg", "b/2.jpg", "3.jpg"):
+            path = os.path.join(root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+        scanner = Scanner()
+        sequential = sorted(os.path.relpath(e.path, root) for e in scanner.scan_directory(root))
+
+        # 'b' finishes listing after 'a', while a's files are still on their way out
+        list_dir = scanner._list_dir
+
+        def slow_list_dir(path, exclude):
+            if os.path.basename(path) == "b":
+                time.sleep(0.1)
+            return list_dir(path, exclude)
+
+        scanner._list_dir = slow_list_dir
+        scanner_module.queue = types.SimpleNamespace(SimpleQueue=_SlowFilesQueue)
+        try:
+            parallel = sorted(os.path.relpath(e.path, root) for e in scanner.scan_directory_parallel(root, workers=4))
+        finally:
+            scanner_module.queue = queue
+
+        assert sequential == sorted([os.path.join("a", "1.jpg"), os.path.join("b", "2.jpg"), "3.jpg"])
+        assert parallel == sequential
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print("Parallel Scan Test Passed!")
+
+
+if __name__ == "__main__":
+    test_parallel_scan_slow_directory()
@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from src.core.text_embed_cache import TextEmbeddingCache
+
+
+def test_text_embed_cache():
+    print("=== Testing Text Embedding Cache ===")
+    cache_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(cache_dir, "text_embeddings.db")
+        cache = TextEmbeddingCache(path, "ViT-L-14/test", 768)
+        vec = np.random.randn(768).astype(np.float32)
+
+        assert cache.get("red umbrella") is None
+        cache.put("red umbrella", vec)
+        assert np.array_equal(cache.get("red umbrella"), vec)
+
+        # Persists across instances; keys are scoped to the model id
+        assert np.array_equal(TextEmbeddingCache(path, "ViT-L-14/test", 768).get("red umbrella"), vec)
+        assert TextEmbeddingCache(path, "ViT-B-32/test", 768).get("red umbrella") is None
+
+        cache.put_many({"photo": vec, "sketch": -vec})
+        found = cache.get_many(["photo", "sketch", "manga"])
+        assert sorted(found) == ["photo", "sketch"]
+        assert np.array_equal(found["sketch"], -vec)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print("Text Embedding Cache Test Passed!")
+
+
+if __name__ == "__main__":
+    test_text_embed_cache()
@@ -124,8 +124,8 @@ export function ScanUI() {
                     </div>
 
                     <div className="flex justify-between items-center text-[10px] text-zinc-500 font-mono">
-                        <span>{status?.processed_count || 0} / {status?.total_files || 0} Files</span>
-                        <span>ETA: {formatETA(status?.eta_seconds)}</span>
+                        <span>{status?.processed_count || 0} / {status?.total_files || 0}{status?.total_final === false ? "+" : ""} Files</span>
+                        <span>ETA: {status?.total_final === false ? "~" : ""}{formatETA(status?.eta_seconds)}</span>
                     </div>
                 </div>
             )}
@@ -59,14 +59,23 @@ export const chatWithImage = async (
     file_path: string,
     prompt: string
 ): Promise<string> => {
+    // Submit the question, then poll until the background VLM worker answers
     const res = await fetch(`${API_BASE_URL}/gallery/chat`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ file_path, prompt }),
     });
     if (!res.ok) throw new Error("Chat failed");
-    const data = await res.json();
-    return data.answer;
+    const { job_id } = await res.json();
+
+    while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        const poll = await fetch(`${API_BASE_URL}/gallery/chat/${job_id}`);
+        if (!poll.ok) throw new Error("Chat failed");
+        const job = await poll.json();
+        if (job.status === "done") return job.answer;
+        if (job.status === "error") throw new Error(job.error || "Chat failed");
+    }
 };
 
 export const getThumbnailUrl = (id: number, size: number = 400) =>